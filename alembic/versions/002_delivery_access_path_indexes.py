@@ -0,0 +1,38 @@
+"""Access-path indexes on deliveries
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps deliveries writable while the indexes build, which
+    # requires running outside of the migration transaction
+    with op.get_context().autocommit_block():
+        # GET /deliveries/my-deliveries, /deliveries/history (client)
+        op.create_index('ix_deliveries_client_id_created_at', 'deliveries', ['client_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        # /deliveries/history (livreur)
+        op.create_index('ix_deliveries_livreur_id_created_at', 'deliveries', ['livreur_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        # GET /deliveries/, /deliveries/history (manager), /webhook/deliveries/events
+        op.create_index('ix_deliveries_created_at_id', 'deliveries', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        # /stats pending count and the queue of deliveries waiting for a courier
+        op.create_index('ix_deliveries_pending_created_at', 'deliveries', ['created_at', 'id'], unique=False, postgresql_concurrently=True, postgresql_where=sa.text("statut = 'EN_ATTENTE'"))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_deliveries_pending_created_at', table_name='deliveries', postgresql_concurrently=True)
+        op.drop_index('ix_deliveries_created_at_id', table_name='deliveries', postgresql_concurrently=True)
+        op.drop_index('ix_deliveries_livreur_id_created_at', table_name='deliveries', postgresql_concurrently=True)
+        op.drop_index('ix_deliveries_client_id_created_at', table_name='deliveries', postgresql_concurrently=True)
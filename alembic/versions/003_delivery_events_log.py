@@ -0,0 +1,53 @@
+"""Append-only delivery event log partitioned by month
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('delivery_events',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('event_type', sa.String(), nullable=False),
+    sa.Column('delivery_id', sa.Integer(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=True),
+    sa.Column('livreur_id', sa.Integer(), nullable=True),
+    sa.Column('statut', postgresql.ENUM('EN_ATTENTE', 'ASSIGNE', 'EN_ROUTE_PICKUP', 'ARRIVE_PICKUP', 'COLIS_RECUPERE', 'EN_ROUTE_LIVRAISON', 'LIVRE', 'ANNULE', name='deliverystatus', create_type=False), nullable=True),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index('ix_delivery_events_created_at_id', 'delivery_events', ['created_at', 'id'], unique=False)
+    op.create_index('ix_delivery_events_delivery_id_created_at', 'delivery_events', ['delivery_id', 'created_at', 'id'], unique=False)
+
+    # Filet de sécurité pour les lignes hors des partitions mensuelles
+    op.execute("CREATE TABLE delivery_events_default PARTITION OF delivery_events DEFAULT")
+    # Mois courant et deux mois d'avance ; les suivants sont créés au démarrage
+    # de l'application (app/services/event_log.py)
+    today = date.today()
+    for offset in range(3):
+        year, month = today.year + (today.month - 1 + offset) // 12, (today.month - 1 + offset) % 12 + 1
+        next_year, next_month = year + month // 12, month % 12 + 1
+        op.execute(
+            f"CREATE TABLE delivery_events_y{year:04d}m{month:02d} PARTITION OF delivery_events "
+            f"FOR VALUES FROM ('{year:04d}-{month:02d}-01') TO ('{next_year:04d}-{next_month:02d}-01')"
+        )
+
+
+def downgrade() -> None:
+    # Supprime aussi toutes les partitions
+    op.drop_table('delivery_events')
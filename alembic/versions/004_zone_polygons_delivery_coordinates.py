@@ -0,0 +1,34 @@
+"""Zone polygons and delivery pickup/dropoff coordinates
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Colonnes nullables : pas de réécriture des tables existantes
+    op.add_column('delivery_zones', sa.Column('polygon', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('deliveries', sa.Column('pickup_lat', sa.Float(), nullable=True))
+    op.add_column('deliveries', sa.Column('pickup_lon', sa.Float(), nullable=True))
+    op.add_column('deliveries', sa.Column('dropoff_lat', sa.Float(), nullable=True))
+    op.add_column('deliveries', sa.Column('dropoff_lon', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('deliveries', 'dropoff_lon')
+    op.drop_column('deliveries', 'dropoff_lat')
+    op.drop_column('deliveries', 'pickup_lon')
+    op.drop_column('deliveries', 'pickup_lat')
+    op.drop_column('delivery_zones', 'polygon')
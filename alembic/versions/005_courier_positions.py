@@ -0,0 +1,34 @@
+"""Courier GPS positions
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Pas de clé étrangère : les positions arrivent par lots et ne sont jamais mises à jour
+    op.create_table('courier_positions',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('livreur_id', sa.Integer(), nullable=False),
+    sa.Column('lat', sa.REAL(), nullable=False),
+    sa.Column('lon', sa.REAL(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_courier_positions_livreur_id_recorded_at', 'courier_positions', ['livreur_id', 'recorded_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_courier_positions_livreur_id_recorded_at', table_name='courier_positions')
+    op.drop_table('courier_positions')
@@ -0,0 +1,30 @@
+"""Pub/sub payloads too large for NOTIFY
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # UNLOGGED : messages éphémères, inutile de les écrire dans le WAL
+    op.execute("""
+        CREATE UNLOGGED TABLE pubsub_payloads (
+            id BIGSERIAL PRIMARY KEY,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('pubsub_payloads')
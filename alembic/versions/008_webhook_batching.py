@@ -0,0 +1,37 @@
+"""Webhook batching settings and signing secrets per subscription
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+import secrets
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('webhook_subscriptions', sa.Column('secret', sa.String(), nullable=True))
+    op.add_column('webhook_subscriptions', sa.Column('batch_size', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('webhook_subscriptions', sa.Column('batch_linger_ms', sa.Integer(), server_default='0', nullable=False))
+    # Un secret par abonnement existant
+    connection = op.get_bind()
+    for (subscription_id,) in connection.execute(sa.text("SELECT id FROM webhook_subscriptions")).all():
+        connection.execute(
+            sa.text("UPDATE webhook_subscriptions SET secret = :secret WHERE id = :id"),
+            {"secret": secrets.token_hex(32), "id": subscription_id},
+        )
+    op.alter_column('webhook_subscriptions', 'secret', nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column('webhook_subscriptions', 'batch_linger_ms')
+    op.drop_column('webhook_subscriptions', 'batch_size')
+    op.drop_column('webhook_subscriptions', 'secret')
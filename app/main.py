@@ -1,18 +1,55 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from app.database.database import engine, get_db
-from app.routes import auth, deliveries, users, zones, webhooks
+from app.routes import auth, deliveries, users, zones, webhooks, locations
 from app.routes import websockets
 from app.models.models import User, Delivery, DeliveryStatus
+from app.services.dispatch import dispatch_engine, AUTO_DISPATCH_ENABLED
+from app.services.event_log import run_partition_maintenance
+from app.services.zone_cache import zone_list_cache
+from app.services.locations import location_ingestor
+from app.services.courier_index import courier_index
+from app.services.event_bus import event_bus
+from app.services.notifications import register_notification_handlers
+from app.services.pubsub import broker
+from app.services.delivery_waiters import delivery_waiters
+from app.services.webhook_outbox import webhook_dispatcher
+from app.services.http_client import http_client
 
 # Les tables sont créées par Alembic
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Démarrer et arrêter les tâches de fond de l'application"""
+    register_notification_handlers(event_bus)
+    # Client HTTP sortant partagé (webhooks, e-mails)
+    http_client.open()
+    background_tasks = [
+        asyncio.create_task(event_bus.run_forever()),
+        asyncio.create_task(broker.run_forever()),
+        asyncio.create_task(run_partition_maintenance()),
+        asyncio.create_task(location_ingestor.run_forever()),
+        asyncio.create_task(courier_index.run_forever()),
+        asyncio.create_task(websockets.manager.run_forever()),
+        asyncio.create_task(webhook_dispatcher.run_forever()),
+    ]
+    if AUTO_DISPATCH_ENABLED:
+        background_tasks.append(asyncio.create_task(dispatch_engine.run_forever()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await http_client.close()
+
 # Créer l'application FastAPI
 app = FastAPI(
     title="API Livraison Moto",
     description="API pour l'application de livraison à moto",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 origins = [
     "http://localhost.tiangolo.com",
@@ -42,6 +79,7 @@ app.include_router(users.router)
 app.include_router(zones.router)
 app.include_router(webhooks.router)
 app.include_router(websockets.router)
+app.include_router(locations.router)
 
 @app.get("/")
 def read_root():
@@ -66,5 +104,14 @@ def get_stats(db: Session = Depends(get_db)):
     return {
         "total_users": total_users,
         "total_deliveries": total_deliveries,
-        "pending_deliveries": pending_deliveries
+        "pending_deliveries": pending_deliveries,
+        "zone_cache": zone_list_cache.stats(),
+        "locations": location_ingestor.stats(),
+        "courier_index": courier_index.stats(),
+        "websockets": websockets.manager.stats(),
+        "event_bus": event_bus.stats(),
+        "pubsub": broker.stats(),
+        "delivery_waiters": delivery_waiters.stats(),
+        "webhooks": webhook_dispatcher.stats(),
+        "http_client": http_client.stats()
     }
\ No newline at end of file
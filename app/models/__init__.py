@@ -1,3 +1,6 @@
 # Fichier vide - imports directs depuis models.py
 from .models import UserRole, DeliveryStatus, DeliveryType
 from .zone import DeliveryZone
+from .event import DeliveryEvent
+from .location import CourierPosition
+from .webhook import WebhookSubscription, WebhookOutbox, WebhookAttempt
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Enum, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.database.database import Base
+from app.models.models import DeliveryStatus
+
+class DeliveryEvent(Base):
+    """Journal append-only des événements de livraison, partitionné par mois"""
+    __tablename__ = "delivery_events"
+    __table_args__ = (
+        Index("ix_delivery_events_created_at_id", "created_at", "id"),
+        Index("ix_delivery_events_delivery_id_created_at", "delivery_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # La clé de partition doit faire partie de la clé primaire
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
+    event_type = Column(String, nullable=False)
+    delivery_id = Column(Integer, nullable=False)
+    client_id = Column(Integer, nullable=True)
+    livreur_id = Column(Integer, nullable=True)
+    statut = Column(Enum(DeliveryStatus), nullable=True)
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Index, REAL
+from app.database.database import Base
+
+class CourierPosition(Base):
+    """Historique des positions GPS des livreurs (écrit par lots, jamais modifié)"""
+    __tablename__ = "courier_positions"
+    __table_args__ = (
+        Index("ix_courier_positions_livreur_id_recorded_at", "livreur_id", "recorded_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    livreur_id = Column(Integer, nullable=False)
+    # REAL (4 octets) : précision de l'ordre du mètre, suffisante pour un GPS de téléphone
+    lat = Column(REAL, nullable=False)
+    lon = Column(REAL, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -45,12 +45,25 @@ class User(Base):
 
 class Delivery(Base):
     __tablename__ = "deliveries"
+    __table_args__ = (
+        Index("ix_deliveries_client_id_created_at", "client_id", "created_at", "id"),
+        Index("ix_deliveries_livreur_id_created_at", "livreur_id", "created_at", "id"),
+        Index("ix_deliveries_created_at_id", "created_at", "id"),
+        Index(
+            "ix_deliveries_pending_created_at", "created_at", "id",
+            postgresql_where=text("statut = 'EN_ATTENTE'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     type_colis = Column(Enum(DeliveryType), nullable=False)
     description = Column(Text)
     adresse_pickup = Column(Text, nullable=False)
     adresse_dropoff = Column(Text, nullable=False)
+    pickup_lat = Column(Float, nullable=True)
+    pickup_lon = Column(Float, nullable=True)
+    dropoff_lat = Column(Float, nullable=True)
+    dropoff_lon = Column(Float, nullable=True)
     statut = Column(Enum(DeliveryStatus), default=DeliveryStatus.EN_ATTENTE)
     prix = Column(Integer, default=0)  # Prix en centimes
     
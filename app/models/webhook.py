@@ -0,0 +1,56 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index, JSON, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.sql import func
+from app.database.database import Base
+
+WEBHOOK_PENDING = "pending"
+WEBHOOK_DELIVERED = "delivered"
+WEBHOOK_DEAD = "dead"
+
+class WebhookSubscription(Base):
+    """URL d'un partenaire et les événements de livraison qu'elle reçoit"""
+    __tablename__ = "webhook_subscriptions"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, unique=True, nullable=False)
+    events = Column(ARRAY(String), nullable=False)
+    # Clé HMAC des signatures (X-Webhook-Signature)
+    secret = Column(String, nullable=False)
+    # 1 = un POST par événement ; au-delà, tableau JSON d'au plus batch_size événements
+    batch_size = Column(Integer, nullable=False, server_default="1")
+    # Délai d'attente des événements suivants avant d'envoyer un lot
+    batch_linger_ms = Column(Integer, nullable=False, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class WebhookOutbox(Base):
+    """Webhook à envoyer, écrit dans la même transaction que l'événement"""
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (
+        # Seules les lignes en attente sont parcourues par les workers
+        Index("ix_webhook_outbox_due", "next_attempt_at", postgresql_where=text("status = 'pending'")),
+        Index("ix_webhook_outbox_dead", "id", postgresql_where=text("status = 'dead'")),
+        Index("ix_webhook_outbox_delivered_at", "delivered_at", postgresql_where=text("status = 'delivered'")),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    subscription_id = Column(Integer, ForeignKey("webhook_subscriptions.id", ondelete="CASCADE"), nullable=False)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    status = Column(String, nullable=False, server_default=WEBHOOK_PENDING)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+class WebhookAttempt(Base):
+    """Une tentative d'envoi d'un webhook (réussie ou non)"""
+    __tablename__ = "webhook_attempts"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    outbox_id = Column(BigInteger, ForeignKey("webhook_outbox.id", ondelete="CASCADE"), nullable=False, index=True)
+    attempt = Column(Integer, nullable=False)
+    attempted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    duration_ms = Column(Integer, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.database.database import Base
 
@@ -8,6 +9,7 @@ class DeliveryZone(Base):
     id = Column(Integer, primary_key=True, index=True)
     nom_zone = Column(String, nullable=False)
     area = Column(String, nullable=False)  # Description de la zone géographique
+    polygon = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # Liste de [lat, lon]
     prix = Column(Float, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
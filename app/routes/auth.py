@@ -7,7 +7,7 @@ from app.models.models import User
 from app.models import UserRole
 from app.schemas.schemas import UserCreate, UserLogin, User as UserSchema, Token
 from app.services.email_services import email_service
-import asyncio
+from app.services.event_bus import event_bus, UserRegistered
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -47,14 +47,11 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     
     # Envoyer email de bienvenue en arrière-plan
-    try:
-        asyncio.create_task(email_service.send_welcome_email(
-            email=db_user.email,
-            nom=db_user.nom,
-            telephone=db_user.telephone
-        ))
-    except Exception as e:
-        print(f"Erreur envoi email bienvenue: {e}")
+    event_bus.publish(UserRegistered(
+        email=db_user.email,
+        nom=db_user.nom,
+        telephone=db_user.telephone
+    ))
     
     return db_user
 
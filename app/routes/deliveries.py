@@ -1,14 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session, aliased
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import csv
+import io
+import json
+from app.database.database import get_db, SessionLocal
+from app.auth.auth import oauth2_scheme, optional_oauth2_scheme, user_from_token
 from app.dependencies.dependencies import get_current_user, require_roles
 from app.models.models import User, Delivery
 from app.models import UserRole, DeliveryStatus, DeliveryType
-from app.schemas.schemas import DeliveryCreate, DeliveryUpdate, DeliveryAssign, Delivery as DeliverySchema, DeliveryWithClientInfo
-from app.routes.websockets import manager
+from app.schemas.schemas import DeliveryCreate, DeliveryUpdate, DeliveryAssign, DeliveryBulkAssignItem, DeliveryBulkAssignResponse, Delivery as DeliverySchema, DeliveryWithClientInfo, DeliveryPage, GeoPoint, RoutePlan
+from app.services.assignments import assign_deliveries, DELIVERY_NOT_FOUND, NOT_ASSIGNABLE
+from app.services.delivery_status import transition_delivery, allowed_sources, DELIVERY_TRANSITIONS
+from app.services.delivery_waiters import delivery_waiters
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.pricing import pricing_engine
+from app.services.geo import point_or_none
+from app.services.dispatch import ACTIVE_STATUSES
+from app.services.courier_index import courier_index
+from app.services.route_planner import route_planner, stops_for_deliveries
+from app.services.event_log import (
+    delivery_event, record_delivery_events,
+    DELIVERY_CREATED, DELIVERY_STATUS_CHANGED, DELIVERY_CANCELLED,
+)
+from app.services.event_bus import event_bus, DeliveryNotification
+from app.routes.websockets import (
+    delivery_topics, delivery_topic, client_topic, livreur_topic, MANAGERS_TOPIC,
+)
 
 router = APIRouter(prefix="/deliveries", tags=["deliveries"])
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 1000
+MAX_BULK_DELIVERIES = 200
+MAX_STATUS_WAIT_SECONDS = 60
+SSE_KEEPALIVE_SECONDS = 15
+EXPORT_COLUMNS = list(DeliveryWithClientInfo.model_fields)
+
+ClientUser = aliased(User, name="client_user")
+LivreurUser = aliased(User, name="livreur_user")
+
+def _delivery_listing_query(db: Session):
+    """Deliveries with client and livreur info resolved in a single statement"""
+    return (
+        db.query(
+            Delivery.id,
+            Delivery.type_colis,
+            Delivery.description,
+            Delivery.adresse_pickup,
+            Delivery.adresse_dropoff,
+            Delivery.pickup_lat,
+            Delivery.pickup_lon,
+            Delivery.dropoff_lat,
+            Delivery.dropoff_lon,
+            Delivery.statut,
+            Delivery.prix,
+            Delivery.client_id,
+            ClientUser.nom.label('client_nom'),
+            ClientUser.telephone.label('client_telephone'),
+            Delivery.livreur_id,
+            LivreurUser.nom.label('livreur_nom'),
+            LivreurUser.telephone.label('livreur_telephone'),
+            Delivery.created_at,
+            Delivery.updated_at
+        )
+        .join(ClientUser, Delivery.client_id == ClientUser.id)
+        .outerjoin(LivreurUser, Delivery.livreur_id == LivreurUser.id)
+    )
+
+def _apply_delivery_filters(query, statut, livreur_id, client_id, date_from, date_to):
+    """Server-side filters shared by the listing endpoints"""
+    if statut is not None:
+        query = query.filter(Delivery.statut == statut)
+    if livreur_id is not None:
+        query = query.filter(Delivery.livreur_id == livreur_id)
+    if client_id is not None:
+        query = query.filter(Delivery.client_id == client_id)
+    if date_from is not None:
+        query = query.filter(Delivery.created_at >= date_from)
+    if date_to is not None:
+        query = query.filter(Delivery.created_at < date_to)
+    return query
+
+def _paginate_deliveries(query, cursor: Optional[str], limit: int) -> DeliveryPage:
+    """Keyset pagination on (created_at, id), newest first"""
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(Delivery.created_at, Delivery.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    rows = (
+        query.order_by(Delivery.created_at.desc(), Delivery.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return DeliveryPage(
+        items=[DeliveryWithClientInfo(**row._mapping) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+def _created_event(delivery: Delivery) -> dict:
+    return delivery_event(
+        DELIVERY_CREATED,
+        delivery,
+        type_colis=delivery.type_colis.value,
+        adresse_pickup=delivery.adresse_pickup,
+        adresse_dropoff=delivery.adresse_dropoff,
+        prix=delivery.prix,
+    )
+
+def _quote(payload: DeliveryCreate) -> int:
+    return pricing_engine.quote(
+        payload.adresse_pickup,
+        payload.adresse_dropoff,
+        point_or_none(payload.pickup_lat, payload.pickup_lon),
+        point_or_none(payload.dropoff_lat, payload.dropoff_lon),
+    )
+
 @router.post("/create", response_model=DeliverySchema)
 def create_delivery(
     payload: DeliveryCreate,
@@ -26,105 +144,196 @@ def create_delivery(
         description=payload.description,
         adresse_pickup=payload.adresse_pickup,
         adresse_dropoff=payload.adresse_dropoff,
+        pickup_lat=payload.pickup_lat,
+        pickup_lon=payload.pickup_lon,
+        dropoff_lat=payload.dropoff_lat,
+        dropoff_lon=payload.dropoff_lon,
+        prix=_quote(payload),
         client_id=current_user.id,
         statut=DeliveryStatus.EN_ATTENTE,
     )
     db.add(delivery)
+    db.flush()
+    record_delivery_events(db, [_created_event(delivery)])
     db.commit()
     db.refresh(delivery)
     
     # Broadcast new delivery creation
-    try:
-        from app.routes.websockets import manager as websocket_manager
-        import asyncio
-        import threading
-        
-        def broadcast_in_background():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(websocket_manager.broadcast({
-                    "type": "new_delivery",
-                    "delivery_id": delivery.id,
-                    "client_id": delivery.client_id,
-                    "client_nom": current_user.nom,
-                    "client_telephone": current_user.telephone,
-                    "type_colis": delivery.type_colis.value,
-                    "adresse_pickup": delivery.adresse_pickup,
-                    "adresse_dropoff": delivery.adresse_dropoff,
-                    "status": delivery.statut.value,
-                    "created_at": delivery.created_at.isoformat()
-                }))
-                loop.close()
-            except Exception as e:
-                print(f"WebSocket broadcast error: {e}")
-        
-        thread = threading.Thread(target=broadcast_in_background)
-        thread.daemon = True
-        thread.start()
-    except Exception as e:
-        print(f"WebSocket setup error: {e}")
+    event_bus.publish(DeliveryNotification({
+        "type": "new_delivery",
+        "delivery_id": delivery.id,
+        "client_id": delivery.client_id,
+        "client_nom": current_user.nom,
+        "client_telephone": current_user.telephone,
+        "type_colis": delivery.type_colis.value,
+        "adresse_pickup": delivery.adresse_pickup,
+        "adresse_dropoff": delivery.adresse_dropoff,
+        "status": delivery.statut.value,
+        "created_at": delivery.created_at.isoformat()
+    }, delivery_topics(delivery.id, client_id=delivery.client_id)))
     
     return delivery
 
-@router.post("/{delivery_id}/assign")
-def assign_delivery(
-    delivery_id: int,
-    assign: DeliveryAssign,
+@router.post("/bulk", response_model=list[DeliverySchema])
+def create_deliveries_bulk(
+    payload: list[DeliveryCreate],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Create a batch of deliveries in one multi-row INSERT ... RETURNING"""
+    if current_user.role != UserRole.CLIENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les clients peuvent créer une demande",
+        )
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucune livraison à créer",
+        )
+    if len(payload) > MAX_BULK_DELIVERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {MAX_BULK_DELIVERIES} livraisons par requête",
+        )
+
+    rows = [
+        {
+            "type_colis": item.type_colis,
+            "description": item.description,
+            "adresse_pickup": item.adresse_pickup,
+            "adresse_dropoff": item.adresse_dropoff,
+            "pickup_lat": item.pickup_lat,
+            "pickup_lon": item.pickup_lon,
+            "dropoff_lat": item.dropoff_lat,
+            "dropoff_lon": item.dropoff_lon,
+            "prix": _quote(item),
+            "client_id": current_user.id,
+            "statut": DeliveryStatus.EN_ATTENTE,
+        }
+        for item in payload
+    ]
+    deliveries = db.scalars(
+        insert(Delivery).returning(Delivery, sort_by_parameter_order=True), rows
+    ).all()
+    record_delivery_events(db, [_created_event(delivery) for delivery in deliveries])
+    # Serialize before commit expires the returned rows
+    created = [DeliverySchema.model_validate(delivery) for delivery in deliveries]
+    message = {
+        "type": "new_deliveries",
+        "client_id": current_user.id,
+        "client_nom": current_user.nom,
+        "client_telephone": current_user.telephone,
+        "deliveries": [
+            {
+                "delivery_id": delivery.id,
+                "type_colis": delivery.type_colis.value,
+                "adresse_pickup": delivery.adresse_pickup,
+                "adresse_dropoff": delivery.adresse_dropoff,
+                "status": delivery.statut.value,
+                "created_at": delivery.created_at.isoformat(),
+            }
+            for delivery in created
+        ],
+    }
+    db.commit()
+
+    # One notification for the whole batch
+    event_bus.publish(DeliveryNotification(message, [client_topic(current_user.id), MANAGERS_TOPIC]))
+    return created
+
+def _assigned_message(delivery_id: int, livreur_id: int) -> dict:
+    return {
+        "type": "assigned",
+        "delivery_id": delivery_id,
+        "livreur_id": livreur_id,
+        "status": DeliveryStatus.EN_ROUTE_PICKUP.value
+    }
+
+@router.post("/assign/bulk", response_model=DeliveryBulkAssignResponse)
+def assign_deliveries_bulk(
+    payload: list[DeliveryBulkAssignItem],
     db: Session = Depends(get_db),
     manager: User = Depends(
         require_roles([UserRole.MANAGER, UserRole.ADMIN])
     ),
 ):
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-    if not delivery:
+    """Assign many deliveries in one transaction, reporting success per item"""
+    if not payload:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Livraison introuvable"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucune affectation à traiter",
         )
-
-    livreur = (
-        db.query(User)
-        .filter(
-            User.id == assign.livreur_id,
-            User.role == UserRole.LIVREUR,
+    if len(payload) > MAX_BULK_DELIVERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {MAX_BULK_DELIVERIES} affectations par requête",
         )
-        .first()
+
+    results = assign_deliveries(
+        db, [(item.delivery_id, item.livreur_id) for item in payload]
     )
-    if not livreur:
+    db.commit()
+
+    assignments = [
+        {
+            "delivery_id": result["delivery_id"],
+            "livreur_id": result["livreur_id"],
+            "status": DeliveryStatus.EN_ROUTE_PICKUP.value,
+        }
+        for result in results
+        if result["success"]
+    ]
+    if assignments:
+        event_bus.publish(DeliveryNotification(
+            {"type": "assigned_bulk", "assignments": assignments},
+            [MANAGERS_TOPIC],
+        ))
+        # Clients and livreurs only get their own deliveries
+        for result in results:
+            if result["success"]:
+                event_bus.publish(DeliveryNotification(
+                    _assigned_message(result["delivery_id"], result["livreur_id"]),
+                    [
+                        delivery_topic(result["delivery_id"]),
+                        client_topic(result["client_id"]),
+                        livreur_topic(result["livreur_id"]),
+                    ],
+                ))
+
+    return {
+        "assigned": len(assignments),
+        "failed": len(results) - len(assignments),
+        "results": results,
+    }
+
+@router.post("/{delivery_id}/assign")
+def assign_delivery(
+    delivery_id: int,
+    assign: DeliveryAssign,
+    db: Session = Depends(get_db),
+    manager: User = Depends(
+        require_roles([UserRole.MANAGER, UserRole.ADMIN])
+    ),
+):
+    # Same write path as bulk assignment and the dispatch engine
+    result = assign_deliveries(db, [(delivery_id, assign.livreur_id)])[0]
+    if not result["success"]:
+        error_codes = {
+            DELIVERY_NOT_FOUND: status.HTTP_404_NOT_FOUND,
+            NOT_ASSIGNABLE: status.HTTP_409_CONFLICT,
+        }
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Livreur invalide"
+            status_code=error_codes.get(result["detail"], status.HTTP_400_BAD_REQUEST),
+            detail=result["detail"],
         )
-
-    delivery.livreur_id = livreur.id
-    delivery.statut = DeliveryStatus.EN_ROUTE_PICKUP
     db.commit()
-    db.refresh(delivery)
     # Broadcast assignment
-    try:
-        from app.routes.websockets import manager as websocket_manager
-        import asyncio
-        import threading
-        
-        def broadcast_in_background():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(websocket_manager.broadcast({
-                    "type": "assigned",
-                    "delivery_id": delivery.id,
-                    "livreur_id": livreur.id,
-                    "status": delivery.statut.value
-                }))
-                loop.close()
-            except Exception as e:
-                print(f"WebSocket broadcast error: {e}")
-        
-        thread = threading.Thread(target=broadcast_in_background)
-        thread.daemon = True
-        thread.start()
-    except Exception as e:
-        print(f"WebSocket setup error: {e}")
-    return {"message": "Course assignée", "delivery_id": delivery.id}
+    event_bus.publish(DeliveryNotification(
+        _assigned_message(delivery_id, assign.livreur_id),
+        delivery_topics(delivery_id, client_id=result["client_id"], livreur_id=assign.livreur_id),
+    ))
+    return {"message": "Course assignée", "delivery_id": delivery_id}
 
 @router.post("/{delivery_id}/status", response_model=DeliverySchema)
 def update_status(
@@ -133,50 +342,52 @@ def update_status(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Livraison introuvable"
-        )
-
+    """Apply a validated status transition in a single compare-and-set UPDATE"""
     # Permissions: assigned courier or manager/admin
-    is_assigned_courier = (
-        current_user.role == UserRole.LIVREUR
-        and delivery.livreur_id == current_user.id
-    )
     is_manager = current_user.role in [UserRole.MANAGER, UserRole.ADMIN]
-    if not (is_assigned_courier or is_manager):
+    if not (is_manager or current_user.role == UserRole.LIVREUR):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Accès refusé"
         )
+    conditions = () if is_manager else (Delivery.livreur_id == current_user.id,)
+
+    delivery = transition_delivery(
+        db, delivery_id, update.statut, expected=update.expected_statut, conditions=conditions
+    )
+    if delivery is None:
+        # Slow path only: find out why nothing matched
+        current = (
+            db.query(Delivery.statut, Delivery.livreur_id)
+            .filter(Delivery.id == delivery_id)
+            .first()
+        )
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Livraison introuvable"
+            )
+        if not is_manager and current.livreur_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail="Accès refusé"
+            )
+        if update.expected_statut is not None and current.statut != update.expected_statut:
+            detail = f"Statut modifié entre-temps (statut actuel : {current.statut.value})"
+        else:
+            detail = f"Transition invalide : {current.statut.value} -> {update.statut.value}"
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
 
-    delivery.statut = update.statut
+    event_type = DELIVERY_CANCELLED if delivery.statut == DeliveryStatus.ANNULE else DELIVERY_STATUS_CHANGED
+    record_delivery_events(db, [delivery_event(event_type, delivery)])
+    delivery = DeliverySchema.model_validate(delivery)
     db.commit()
-    db.refresh(delivery)
     # Broadcast status update
-    try:
-        from app.routes.websockets import manager as websocket_manager
-        import asyncio
-        import threading
-        
-        def broadcast_in_background():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(websocket_manager.broadcast({
-                    "type": "status_update",
-                    "delivery_id": delivery.id,
-                    "status": delivery.statut.value
-                }))
-                loop.close()
-            except Exception as e:
-                print(f"WebSocket broadcast error: {e}")
-        
-        thread = threading.Thread(target=broadcast_in_background)
-        thread.daemon = True
-        thread.start()
-    except Exception as e:
-        print(f"WebSocket setup error: {e}")
+    event_bus.publish(DeliveryNotification(
+        {
+            "type": "status_update",
+            "delivery_id": delivery.id,
+            "status": delivery.statut.value
+        },
+        delivery_topics(delivery.id, client_id=delivery.client_id, livreur_id=delivery.livreur_id),
+    ))
     return delivery
 
 @router.get("/my-deliveries", response_model=list[DeliverySchema])
@@ -199,6 +410,59 @@ def get_my_deliveries(
     )
     return deliveries
 
+@router.get("/route", response_model=RoutePlan)
+def plan_route(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    livreur_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Suggested pickup/dropoff order for a livreur's active deliveries
+
+    Starts from lat/lon when given, otherwise from the livreur's last known position.
+    """
+    if current_user.role == UserRole.LIVREUR:
+        livreur_id = current_user.id
+    elif current_user.role in (UserRole.MANAGER, UserRole.ADMIN):
+        if livreur_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="livreur_id requis",
+            )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès refusé",
+        )
+
+    deliveries = (
+        db.query(Delivery)
+        .filter(Delivery.livreur_id == livreur_id, Delivery.statut.in_(ACTIVE_STATUSES))
+        .order_by(Delivery.id)
+        .all()
+    )
+    stops, unplaced = stops_for_deliveries(deliveries)
+    origin = point_or_none(lat, lon) or courier_index.position(livreur_id)
+    ordered, legs = route_planner.plan(stops, origin)
+    return RoutePlan(
+        livreur_id=livreur_id,
+        origin=GeoPoint(lat=origin[0], lon=origin[1]) if origin else None,
+        total_km=round(float(legs.sum()), 3),
+        stops=[
+            {
+                "delivery_id": stop.delivery_id,
+                "kind": stop.kind,
+                "lat": stop.lat,
+                "lon": stop.lon,
+                "adresse": stop.adresse,
+                "leg_km": round(float(leg), 3),
+            }
+            for stop, leg in zip(ordered, legs)
+        ],
+        unplaced=unplaced,
+    )
+
 @router.post("/{delivery_id}/cancel")
 def cancel_delivery(
     delivery_id: int,
@@ -206,252 +470,302 @@ def cancel_delivery(
     current_user: User = Depends(get_current_user)
 ):
     """Cancel delivery - clients can cancel unassigned deliveries, managers/admins can cancel any delivery"""
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail="Livraison introuvable"
-        )
-    
-    # Check if delivery is already cancelled or delivered
-    if delivery.statut in [DeliveryStatus.ANNULE, DeliveryStatus.LIVRE]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Impossible d'annuler une livraison déjà terminée"
-        )
-    
-    # Permission checks
-    is_client_owner = current_user.role == UserRole.CLIENT and delivery.client_id == current_user.id
+    is_client = current_user.role == UserRole.CLIENT
     is_manager_admin = current_user.role in [UserRole.MANAGER, UserRole.ADMIN]
-    
-    if not (is_client_owner or is_manager_admin):
+    if not (is_client or is_manager_admin):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Accès refusé"
         )
-    
-    # Clients can only cancel unassigned deliveries, managers/admins can cancel any
-    if current_user.role == UserRole.CLIENT and delivery.livreur_id is not None:
+
+    # Clients can only cancel their own unassigned deliveries, managers/admins can cancel any
+    conditions = ()
+    if is_client:
+        conditions = (Delivery.client_id == current_user.id, Delivery.livreur_id.is_(None))
+
+    delivery = transition_delivery(db, delivery_id, DeliveryStatus.ANNULE, conditions=conditions)
+    if delivery is None:
+        current = (
+            db.query(Delivery.statut, Delivery.client_id, Delivery.livreur_id)
+            .filter(Delivery.id == delivery_id)
+            .first()
+        )
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Livraison introuvable"
+            )
+        if current.statut not in allowed_sources(DeliveryStatus.ANNULE):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Impossible d'annuler une livraison déjà terminée"
+            )
+        if is_client and current.client_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Accès refusé"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Impossible d'annuler une livraison déjà assignée. Contactez un manager."
         )
-    
-    delivery.statut = DeliveryStatus.ANNULE
+
+    record_delivery_events(db, [delivery_event(DELIVERY_CANCELLED, delivery)])
+    topics = delivery_topics(delivery_id, client_id=delivery.client_id, livreur_id=delivery.livreur_id)
+    cancelled_status = delivery.statut
     db.commit()
     
     # Broadcast cancellation
-    try:
-        from app.routes.websockets import manager as websocket_manager
-        import asyncio
-        import threading
-        
-        def broadcast_in_background():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(websocket_manager.broadcast({
-                    "type": "cancelled",
-                    "delivery_id": delivery.id,
-                    "status": delivery.statut.value
-                }))
-                loop.close()
-            except Exception as e:
-                print(f"WebSocket broadcast error: {e}")
-        
-        thread = threading.Thread(target=broadcast_in_background)
-        thread.daemon = True
-        thread.start()
-    except Exception as e:
-        print(f"WebSocket setup error: {e}")
+    event_bus.publish(DeliveryNotification(
+        {
+            "type": "cancelled",
+            "delivery_id": delivery_id,
+            "status": cancelled_status.value
+        },
+        topics,
+    ))
     
     return {"message": "Livraison annulée avec succès"}
 
-@router.get("/{delivery_id}/status")
-def get_delivery_status(
-    delivery_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """Get real-time status of specific delivery"""
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+def _can_view_status(user: User, client_id: int, livreur_id: Optional[int]) -> bool:
+    is_client = user.role == UserRole.CLIENT and client_id == user.id
+    is_livreur = user.role == UserRole.LIVREUR and livreur_id == user.id
+    is_manager = user.role in [UserRole.MANAGER, UserRole.ADMIN]
+    return is_client or is_livreur or is_manager
+
+def _status_snapshot(delivery_id: int, token: Optional[str] = None) -> dict:
+    """Current status of a delivery, read with a short-lived session
+
+    With a token, the caller is authenticated and its access checked first.
+    Waiting requests must not hold a pooled connection, so they cannot use get_db.
+    """
+    db = SessionLocal()
+    try:
+        user = None
+        if token is not None:
+            user = user_from_token(db, token)
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Could not validate credentials",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        delivery = (
+            db.query(Delivery.id, Delivery.client_id, Delivery.livreur_id, Delivery.statut, Delivery.updated_at)
+            .filter(Delivery.id == delivery_id)
+            .first()
+        )
+    finally:
+        db.close()
     if not delivery:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Livraison introuvable"
         )
-    
-    # Check permissions
-    is_client = current_user.role == UserRole.CLIENT and delivery.client_id == current_user.id
-    is_livreur = current_user.role == UserRole.LIVREUR and delivery.livreur_id == current_user.id
-    is_manager = current_user.role in [UserRole.MANAGER, UserRole.ADMIN]
-    
-    if not (is_client or is_livreur or is_manager):
+    if user is not None and not _can_view_status(user, delivery.client_id, delivery.livreur_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Accès refusé"
         )
-    
     return {
         "delivery_id": delivery.id,
         "status": delivery.statut.value,
         "updated_at": delivery.updated_at
     }
 
-@router.get("/", response_model=list[DeliveryWithClientInfo])
+def _updated_since(snapshot: dict, since: Optional[datetime]) -> bool:
+    if since is None or snapshot["updated_at"] is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return snapshot["updated_at"] > since
+
+def _is_final(snapshot: dict) -> bool:
+    return not DELIVERY_TRANSITIONS[DeliveryStatus(snapshot["status"])]
+
+@router.get("/{delivery_id}/status")
+async def get_delivery_status(
+    delivery_id: int,
+    wait: int = Query(0, ge=0, le=MAX_STATUS_WAIT_SECONDS),
+    since: Optional[datetime] = None,
+    token: str = Depends(oauth2_scheme)
+):
+    """Get real-time status of specific delivery
+
+    With `wait` (seconds), this is a long-poll: the answer comes as soon as
+    the delivery was updated after `since` (immediately if it already was;
+    without `since`, on the next change), or after `wait` seconds with the
+    unchanged status. Waiting costs no database connection.
+    """
+    future = delivery_waiters.watch(delivery_id) if wait else None
+    try:
+        snapshot = await asyncio.to_thread(_status_snapshot, delivery_id, token)
+        if future is None or _updated_since(snapshot, since) or _is_final(snapshot):
+            return snapshot
+        if await delivery_waiters.wait(delivery_id, future, wait):
+            return await asyncio.to_thread(_status_snapshot, delivery_id)
+        return snapshot
+    finally:
+        if future is not None:
+            delivery_waiters.unwatch(delivery_id, future)
+
+def _sse_event(snapshot: dict) -> tuple[str, str]:
+    updated_at = snapshot["updated_at"]
+    event_id = updated_at.isoformat() if updated_at is not None else snapshot["status"]
+    data = json.dumps(jsonable_encoder(snapshot), separators=(",", ":"))
+    return event_id, f"id: {event_id}\nevent: status\ndata: {data}\n\n"
+
+@router.get("/{delivery_id}/events")
+async def stream_delivery_status(
+    delivery_id: int,
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    token_param: Optional[str] = Query(None, alias="token")
+):
+    """Server-Sent Events stream of a delivery's status
+
+    Sends the current status, then one `status` event per change, and ends
+    once the delivery is delivered or cancelled. The token can be passed as
+    `?token=` for EventSource clients, which cannot set headers. A
+    reconnecting client sending Last-Event-ID skips an unchanged status.
+    """
+    token = token or token_param
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    future = delivery_waiters.watch(delivery_id)
+    try:
+        snapshot = await asyncio.to_thread(_status_snapshot, delivery_id, token)
+    except Exception:
+        delivery_waiters.unwatch(delivery_id, future)
+        raise
+
+    async def events(future, snapshot):
+        last_event_id = request.headers.get("last-event-id")
+        try:
+            while True:
+                event_id, event = _sse_event(snapshot)
+                if event_id != last_event_id:
+                    yield event
+                    last_event_id = event_id
+                if _is_final(snapshot):
+                    return
+                changed = await delivery_waiters.wait(delivery_id, future, SSE_KEEPALIVE_SECONDS)
+                # Watch again before reading, so no change is missed in between
+                future = delivery_waiters.watch(delivery_id)
+                if not changed:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                try:
+                    snapshot = await asyncio.to_thread(_status_snapshot, delivery_id)
+                except HTTPException:
+                    return
+        finally:
+            delivery_waiters.unwatch(delivery_id, future)
+
+    return StreamingResponse(
+        events(future, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/", response_model=DeliveryPage)
 def get_deliveries(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    statut: Optional[DeliveryStatus] = None,
+    livreur_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     db: Session = Depends(get_db),
     manager: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
 ):
-    """Get all deliveries with client and livreur contact info"""
-    deliveries = (
-        db.query(
-            Delivery.id,
-            Delivery.type_colis,
-            Delivery.description,
-            Delivery.adresse_pickup,
-            Delivery.adresse_dropoff,
-            Delivery.statut,
-            Delivery.prix,
-            Delivery.client_id,
-            User.nom.label('client_nom'),
-            User.telephone.label('client_telephone'),
-            Delivery.livreur_id,
-            Delivery.created_at,
-            Delivery.updated_at
-        )
-        .join(User, Delivery.client_id == User.id)
-        .all()
+    """Get all deliveries with client and livreur contact info (keyset pagination)"""
+    query = _apply_delivery_filters(
+        _delivery_listing_query(db), statut, livreur_id, client_id, date_from, date_to
     )
-    
-    result = []
-    for delivery in deliveries:
-        # Get livreur info if exists
-        livreur_nom = None
-        livreur_telephone = None
-        if delivery.livreur_id:
-            livreur = db.query(User).filter(User.id == delivery.livreur_id).first()
-            if livreur:
-                livreur_nom = livreur.nom
-                livreur_telephone = livreur.telephone
-        
-        result.append(DeliveryWithClientInfo(
-            id=delivery.id,
-            type_colis=delivery.type_colis,
-            description=delivery.description,
-            adresse_pickup=delivery.adresse_pickup,
-            adresse_dropoff=delivery.adresse_dropoff,
-            statut=delivery.statut,
-            prix=delivery.prix,
-            client_id=delivery.client_id,
-            client_nom=delivery.client_nom,
-            client_telephone=delivery.client_telephone,
-            livreur_id=delivery.livreur_id,
-            livreur_nom=livreur_nom,
-            livreur_telephone=livreur_telephone,
-            created_at=delivery.created_at,
-            updated_at=delivery.updated_at
-        ))
-    
-    return result
+    return _paginate_deliveries(query, cursor, limit)
 
-@router.get("/history", response_model=list[DeliveryWithClientInfo])
+@router.get("/history", response_model=DeliveryPage)
 def get_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    statut: Optional[DeliveryStatus] = None,
+    livreur_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
 ):
-    """Get delivery history with client and livreur contact info"""
+    """Get delivery history with client and livreur contact info (keyset pagination)"""
+    # Clients and livreurs only ever see their own deliveries
     if current_user.role == UserRole.CLIENT:
-        deliveries = (
-            db.query(
-                Delivery.id,
-                Delivery.type_colis,
-                Delivery.description,
-                Delivery.adresse_pickup,
-                Delivery.adresse_dropoff,
-                Delivery.statut,
-                Delivery.prix,
-                Delivery.client_id,
-                User.nom.label('client_nom'),
-                User.telephone.label('client_telephone'),
-                Delivery.livreur_id,
-                Delivery.created_at,
-                Delivery.updated_at
-            )
-            .join(User, Delivery.client_id == User.id)
-            .filter(Delivery.client_id == current_user.id)
-            .all()
-        )
+        client_id = current_user.id
     elif current_user.role == UserRole.LIVREUR:
-        deliveries = (
-            db.query(
-                Delivery.id,
-                Delivery.type_colis,
-                Delivery.description,
-                Delivery.adresse_pickup,
-                Delivery.adresse_dropoff,
-                Delivery.statut,
-                Delivery.prix,
-                Delivery.client_id,
-                User.nom.label('client_nom'),
-                User.telephone.label('client_telephone'),
-                Delivery.livreur_id,
-                Delivery.created_at,
-                Delivery.updated_at
-            )
-            .join(User, Delivery.client_id == User.id)
-            .filter(Delivery.livreur_id == current_user.id)
-            .all()
-        )
-    elif current_user.role in [UserRole.MANAGER, UserRole.ADMIN]:
-        deliveries = (
-            db.query(
-                Delivery.id,
-                Delivery.type_colis,
-                Delivery.description,
-                Delivery.adresse_pickup,
-                Delivery.adresse_dropoff,
-                Delivery.statut,
-                Delivery.prix,
-                Delivery.client_id,
-                User.nom.label('client_nom'),
-                User.telephone.label('client_telephone'),
-                Delivery.livreur_id,
-                Delivery.created_at,
-                Delivery.updated_at
-            )
-            .join(User, Delivery.client_id == User.id)
-            .all()
+        livreur_id = current_user.id
+    elif current_user.role not in [UserRole.MANAGER, UserRole.ADMIN]:
+        return DeliveryPage(items=[], next_cursor=None)
+
+    query = _apply_delivery_filters(
+        _delivery_listing_query(db), statut, livreur_id, client_id, date_from, date_to
+    )
+    return _paginate_deliveries(query, cursor, limit)
+
+def _stream_deliveries_export(export_format: str, filters: tuple):
+    """Yield serialized deliveries batch by batch from a server-side cursor"""
+    # The request-scoped session is closed once the endpoint returns, so the
+    # stream owns its own session for the lifetime of the response
+    db = SessionLocal()
+    try:
+        query = (
+            _apply_delivery_filters(_delivery_listing_query(db), *filters)
+            .order_by(Delivery.created_at.desc(), Delivery.id.desc())
+            .yield_per(EXPORT_BATCH_SIZE)
         )
-    else:
-        deliveries = []
-    
-    result = []
-    for delivery in deliveries:
-        # Get livreur info if exists
-        livreur_nom = None
-        livreur_telephone = None
-        if delivery.livreur_id:
-            livreur = db.query(User).filter(User.id == delivery.livreur_id).first()
-            if livreur:
-                livreur_nom = livreur.nom
-                livreur_telephone = livreur.telephone
-        
-        result.append(DeliveryWithClientInfo(
-            id=delivery.id,
-            type_colis=delivery.type_colis,
-            description=delivery.description,
-            adresse_pickup=delivery.adresse_pickup,
-            adresse_dropoff=delivery.adresse_dropoff,
-            statut=delivery.statut,
-            prix=delivery.prix,
-            client_id=delivery.client_id,
-            client_nom=delivery.client_nom,
-            client_telephone=delivery.client_telephone,
-            livreur_id=delivery.livreur_id,
-            livreur_nom=livreur_nom,
-            livreur_telephone=livreur_telephone,
-            created_at=delivery.created_at,
-            updated_at=delivery.updated_at
-        ))
-    
-    return result
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        if export_format == "csv":
+            writer.writeheader()
+
+        pending = 0
+        for row in query:
+            item = DeliveryWithClientInfo(**row._mapping)
+            if export_format == "csv":
+                writer.writerow(item.model_dump(mode="json"))
+            else:
+                buffer.write(item.model_dump_json())
+                buffer.write("\n")
+            pending += 1
+            if pending >= EXPORT_BATCH_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+@router.get("/export")
+def export_deliveries(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    statut: Optional[DeliveryStatus] = None,
+    livreur_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    manager: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
+):
+    """Stream every matching delivery as NDJSON or CSV without buffering the result set"""
+    filters = (statut, livreur_id, client_id, date_from, date_to)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_deliveries_export(format, filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="deliveries.{format}"'},
+    )
@@ -0,0 +1,81 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from pydantic import TypeAdapter, ValidationError
+from app.database.database import SessionLocal
+from app.auth.auth import user_from_token
+from app.dependencies.dependencies import require_roles
+from app.models.models import User
+from app.models import UserRole
+from app.schemas.schemas import LocationPing, LocationBatchResult
+from app.services.locations import location_ingestor
+
+router = APIRouter(tags=["locations"])
+
+MAX_LOCATION_BATCH = 500
+
+_pings = TypeAdapter(list[LocationPing])
+
+@router.post(
+    "/locations/batch",
+    response_model=LocationBatchResult,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def ingest_locations(
+    pings: list[LocationPing],
+    livreur: User = Depends(require_roles([UserRole.LIVREUR]))
+):
+    """Queue GPS positions from the current livreur; they are written in periodic batches"""
+    if len(pings) > MAX_LOCATION_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {MAX_LOCATION_BATCH} positions par requête",
+        )
+    return LocationBatchResult(accepted=location_ingestor.add(livreur.id, pings))
+
+def _livreur_id_from_token(token: str):
+    db = SessionLocal()
+    try:
+        user = user_from_token(db, token)
+        if user is None or user.role != UserRole.LIVREUR:
+            return None
+        return user.id
+    finally:
+        db.close()
+
+@router.websocket("/ws/locations")
+async def locations_websocket(websocket: WebSocket, token: str = Query(...)):
+    """Position stream of one livreur: each message is a ping or a list of pings
+
+    JSON in text frames, or UTF-8 JSON in binary frames.
+    """
+    livreur_id = await asyncio.to_thread(_livreur_id_from_token, token)
+    if livreur_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+            payload = message.get("text")
+            if payload is None:
+                payload = message.get("bytes")
+            try:
+                if payload is None:
+                    raise ValueError("Message vide")
+                data = json.loads(payload)
+                pings = _pings.validate_python(data if isinstance(data, list) else [data])
+            except (ValueError, ValidationError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if len(pings) > MAX_LOCATION_BATCH:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": f"Maximum {MAX_LOCATION_BATCH} positions par message",
+                })
+                continue
+            location_ingestor.add(livreur_id, pings)
+    except WebSocketDisconnect:
+        pass
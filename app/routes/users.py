@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from app.database.database import get_db
 from app.dependencies.dependencies import get_current_user, require_roles
 from app.models.models import User
 from app.models import UserRole
-from app.schemas.schemas import User as UserSchema
+from app.schemas.schemas import User as UserSchema, NearestLivreur
+from app.services.courier_index import courier_index
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -37,3 +38,13 @@ def list_livreurs(
     livreurs = db.query(User).filter(User.role == UserRole.LIVREUR).all()
     return livreurs
 
+
+@router.get("/livreurs/nearest", response_model=list[NearestLivreur])
+def nearest_livreurs(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=50),
+    manager: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
+):
+    """Nearest free livreurs with a recent position, served from the in-memory courier index"""
+    return courier_index.nearest(lat, lon, k)
@@ -1,33 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
 from app.database.database import get_db
 from app.dependencies.dependencies import get_current_user, require_roles
 from app.models.models import User, Delivery
-from app.models import UserRole, DeliveryStatus
+from app.models import UserRole, DeliveryStatus, DeliveryEvent, WebhookSubscription, WebhookOutbox, WebhookAttempt
+from app.models.webhook import WEBHOOK_PENDING, WEBHOOK_DEAD
 from app.schemas.schemas import DeliveryWithClientInfo
-from typing import List
+from app.services.event_log import DELIVERY_CREATED, DELIVERY_ASSIGNED, DELIVERY_STATUS_CHANGED, DELIVERY_CANCELLED
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.webhook_outbox import webhook_dispatcher, WEBHOOK_MAX_BATCH_SIZE, WEBHOOK_MAX_LINGER_MS
+from typing import List, Optional
 import json
+import secrets
 
 router = APIRouter(prefix="/webhook", tags=["webhooks"])
 
-# Store webhook URLs for external services
-webhook_subscribers = {
-    "delivery_created": [],
-    "delivery_assigned": [],
-    "delivery_status_changed": [],
-    "delivery_cancelled": []
-}
+# Webhook events are the delivery event log types (app/services/event_log.py)
+WEBHOOK_EVENTS = [DELIVERY_CREATED, DELIVERY_ASSIGNED, DELIVERY_STATUS_CHANGED, DELIVERY_CANCELLED]
 
 @router.post("/deliveries/subscribe")
 def subscribe_to_delivery_webhooks(
     webhook_url: str,
     events: List[str],
+    batch_size: Optional[int] = Query(None, ge=1, le=WEBHOOK_MAX_BATCH_SIZE),
+    batch_linger_ms: Optional[int] = Query(None, ge=0, le=WEBHOOK_MAX_LINGER_MS),
+    db: Session = Depends(get_db),
     current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
 ):
-    """Subscribe to delivery webhook events"""
+    """Subscribe to delivery webhook events
+
+    With batch_size > 1 the URL receives a JSON array of up to batch_size
+    webhooks per POST, sent once an event has waited batch_linger_ms or the
+    batch is full. Every POST is signed: X-Webhook-Signature is
+    "sha256=" + HMAC-SHA256(secret, X-Webhook-Timestamp + "." + raw body).
+    """
     import re
     
-    valid_events = ["delivery_created", "delivery_assigned", "delivery_status_changed", "delivery_cancelled"]
+    valid_events = WEBHOOK_EVENTS
     
     # Validate webhook URL format
     url_pattern = re.compile(
@@ -50,41 +60,65 @@ def subscribe_to_delivery_webhooks(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid event: {event}. Valid events: {valid_events}"
             )
-        
-        if webhook_url not in webhook_subscribers[event]:
-            webhook_subscribers[event].append(webhook_url)
+    
+    subscription = db.query(WebhookSubscription).filter(WebhookSubscription.url == webhook_url).first()
+    if subscription is None:
+        subscription = WebhookSubscription(
+            url=webhook_url,
+            events=sorted(set(events)),
+            secret=secrets.token_hex(32),
+            batch_size=batch_size or 1,
+            batch_linger_ms=batch_linger_ms or 0,
+        )
+        db.add(subscription)
+    else:
+        subscription.events = sorted(set(subscription.events) | set(events))
+        # Batching settings are only changed when given
+        if batch_size is not None:
+            subscription.batch_size = batch_size
+        if batch_linger_ms is not None:
+            subscription.batch_linger_ms = batch_linger_ms
+    db.commit()
     
     return {
         "message": "Successfully subscribed to webhook events",
         "webhook_url": webhook_url,
         "events": events,
+        "batch_size": subscription.batch_size,
+        "batch_linger_ms": subscription.batch_linger_ms,
+        "secret": subscription.secret,
         "note": "localhost URLs are supported for development. Use production URLs when deployed."
     }
 
 @router.get("/deliveries/subscribers")
 def get_webhook_subscribers(
+    db: Session = Depends(get_db),
     current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
 ):
     """Get all webhook subscribers"""
-    return webhook_subscribers
+    subscribers = {event: [] for event in WEBHOOK_EVENTS}
+    for subscription in db.query(WebhookSubscription).order_by(WebhookSubscription.id):
+        for event in subscription.events:
+            subscribers.setdefault(event, []).append(subscription.url)
+    return subscribers
 
 @router.delete("/deliveries/unsubscribe")
 def unsubscribe_from_delivery_webhooks(
     webhook_url: str,
     events: List[str] = None,
+    db: Session = Depends(get_db),
     current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
 ):
     """Unsubscribe from delivery webhook events"""
-    if events is None:
-        # Remove from all events
-        for event_list in webhook_subscribers.values():
-            if webhook_url in event_list:
-                event_list.remove(webhook_url)
-    else:
-        # Remove from specific events
-        for event in events:
-            if event in webhook_subscribers and webhook_url in webhook_subscribers[event]:
-                webhook_subscribers[event].remove(webhook_url)
+    subscription = db.query(WebhookSubscription).filter(WebhookSubscription.url == webhook_url).first()
+    if subscription is not None:
+        remaining = [] if events is None else [event for event in subscription.events if event not in events]
+        # Without any event left the subscription and its pending webhooks are deleted
+        if remaining:
+            subscription.events = remaining
+        else:
+            db.delete(subscription)
+        db.commit()
     
     return {
         "message": "Successfully unsubscribed from webhook events",
@@ -93,97 +127,148 @@ def unsubscribe_from_delivery_webhooks(
 
 @router.get("/deliveries/events")
 def get_recent_delivery_events(
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=200),
+    cursor: Optional[str] = None,
+    delivery_id: Optional[int] = None,
+    event_type: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
 ):
-    """Get recent delivery events for webhook testing"""
-    deliveries = (
-        db.query(
-            Delivery.id,
-            Delivery.type_colis,
-            Delivery.description,
-            Delivery.adresse_pickup,
-            Delivery.adresse_dropoff,
-            Delivery.statut,
-            Delivery.prix,
-            Delivery.client_id,
-            User.nom.label('client_nom'),
-            User.telephone.label('client_telephone'),
-            Delivery.livreur_id,
-            Delivery.created_at,
-            Delivery.updated_at
+    """Read the append-only delivery event log, newest first (keyset pagination)"""
+    query = db.query(DeliveryEvent)
+    if delivery_id is not None:
+        query = query.filter(DeliveryEvent.delivery_id == delivery_id)
+    if event_type is not None:
+        query = query.filter(DeliveryEvent.event_type == event_type)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(DeliveryEvent.created_at, DeliveryEvent.id) < tuple_(cursor_created_at, cursor_id)
         )
-        .join(User, Delivery.client_id == User.id)
-        .order_by(Delivery.created_at.desc())
-        .limit(limit)
+    rows = (
+        query.order_by(DeliveryEvent.created_at.desc(), DeliveryEvent.id.desc())
+        .limit(limit + 1)
         .all()
     )
-    
-    events = []
-    for delivery in deliveries:
-        # Get livreur info if exists
-        livreur_nom = None
-        livreur_telephone = None
-        if delivery.livreur_id:
-            livreur = db.query(User).filter(User.id == delivery.livreur_id).first()
-            if livreur:
-                livreur_nom = livreur.nom
-                livreur_telephone = livreur.telephone
-        
-        event = {
-            "type": "delivery_created",
-            "delivery_id": delivery.id,
-            "client_id": delivery.client_id,
-            "client_nom": delivery.client_nom,
-            "client_telephone": delivery.client_telephone,
-            "livreur_id": delivery.livreur_id,
-            "livreur_nom": livreur_nom,
-            "livreur_telephone": livreur_telephone,
-            "type_colis": delivery.type_colis.value,
-            "adresse_pickup": delivery.adresse_pickup,
-            "adresse_dropoff": delivery.adresse_dropoff,
-            "status": delivery.statut.value,
-            "prix": delivery.prix,
-            "created_at": delivery.created_at.isoformat(),
-            "updated_at": delivery.updated_at.isoformat() if delivery.updated_at else None
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    events = [
+        {
+            "id": event.id,
+            "type": event.event_type,
+            "delivery_id": event.delivery_id,
+            "client_id": event.client_id,
+            "livreur_id": event.livreur_id,
+            "status": event.statut.value if event.statut else None,
+            "data": event.payload,
+            "created_at": event.created_at.isoformat(),
         }
-        events.append(event)
-    
+        for event in rows
+    ]
     return {
         "events": events,
-        "total": len(events)
+        "total": len(events),
+        "next_cursor": next_cursor
     }
 
-# Webhook utility function to send HTTP requests
-async def send_webhook_notification(event_type: str, data: dict):
-    """Send webhook notification to all subscribers"""
-    import httpx
-    import asyncio
-    
-    if event_type not in webhook_subscribers:
-        return
-    
-    urls = webhook_subscribers[event_type]
-    if not urls:
-        return
-    
-    async def send_to_url(url: str):
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    url,
-                    json={
-                        "event": event_type,
-                        "timestamp": data.get("created_at", ""),
-                        "data": data
-                    },
-                    headers={"Content-Type": "application/json"}
-                )
-                print(f"Webhook sent to {url}: {response.status_code}")
-        except Exception as e:
-            print(f"Failed to send webhook to {url}: {e}")
-    
-    # Send to all URLs concurrently
-    tasks = [send_to_url(url) for url in urls]
-    await asyncio.gather(*tasks, return_exceptions=True)
+def _outbox_entry(entry: WebhookOutbox, url: str) -> dict:
+    return {
+        "id": entry.id,
+        "webhook_url": url,
+        "event": entry.event_type,
+        "status": entry.status,
+        "attempts": entry.attempts,
+        "next_attempt_at": entry.next_attempt_at.isoformat(),
+        "last_error": entry.last_error,
+        "created_at": entry.created_at.isoformat(),
+        "delivered_at": entry.delivered_at.isoformat() if entry.delivered_at else None,
+        "payload": entry.payload,
+    }
+
+@router.get("/deliveries/outbox")
+def get_webhook_outbox(
+    status_filter: str = Query(WEBHOOK_DEAD, alias="status", pattern="^(pending|delivered|dead)$"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
+):
+    """Outgoing webhooks by status, newest first; dead letters by default"""
+    query = (
+        db.query(WebhookOutbox, WebhookSubscription.url)
+        .join(WebhookSubscription, WebhookSubscription.id == WebhookOutbox.subscription_id)
+        .filter(WebhookOutbox.status == status_filter)
+    )
+    if cursor is not None:
+        query = query.filter(WebhookOutbox.id < cursor)
+    rows = query.order_by(WebhookOutbox.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0].id
+    return {
+        "webhooks": [_outbox_entry(entry, url) for entry, url in rows],
+        "total": len(rows),
+        "next_cursor": next_cursor,
+    }
+
+@router.get("/deliveries/outbox/{outbox_id}")
+def get_webhook_outbox_entry(
+    outbox_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
+):
+    """One outgoing webhook with all its delivery attempts"""
+    row = (
+        db.query(WebhookOutbox, WebhookSubscription.url)
+        .join(WebhookSubscription, WebhookSubscription.id == WebhookOutbox.subscription_id)
+        .filter(WebhookOutbox.id == outbox_id)
+        .first()
+    )
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook not found")
+    entry, url = row
+    attempts = (
+        db.query(WebhookAttempt)
+        .filter(WebhookAttempt.outbox_id == outbox_id)
+        .order_by(WebhookAttempt.id)
+        .all()
+    )
+    return {
+        **_outbox_entry(entry, url),
+        "attempt_log": [
+            {
+                "attempt": attempt.attempt,
+                "attempted_at": attempt.attempted_at.isoformat(),
+                "duration_ms": attempt.duration_ms,
+                "status_code": attempt.status_code,
+                "error": attempt.error,
+            }
+            for attempt in attempts
+        ],
+    }
+
+@router.post("/deliveries/outbox/{outbox_id}/retry")
+def retry_webhook(
+    outbox_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_roles([UserRole.MANAGER, UserRole.ADMIN]))
+):
+    """Send a dead-lettered webhook again, with a fresh attempt budget"""
+    entry = db.query(WebhookOutbox).filter(WebhookOutbox.id == outbox_id).with_for_update().first()
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook not found")
+    if entry.status != WEBHOOK_DEAD:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Only dead webhooks can be retried (status: {entry.status})",
+        )
+    entry.status = WEBHOOK_PENDING
+    entry.attempts = 0
+    entry.next_attempt_at = func.now()
+    db.commit()
+    webhook_dispatcher.wake()
+    return {"message": "Webhook queued for delivery", "id": outbox_id}
@@ -1,32 +1,681 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List, Dict, Any
+import asyncio
+import json
+import os
+import uuid
+from collections import OrderedDict, deque
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+from typing import Dict, Any, Iterable, Optional
+from app.database.database import SessionLocal
+from app.auth.auth import user_from_token
+from app.models.models import Delivery
+from app.models import UserRole
+
+try:
+    import msgpack
+except ImportError:  # encodage binaire indisponible : les clients restent en JSON
+    msgpack = None
+
+# Trame binaire illisible (les autres erreurs de msgpack dérivent de ValueError)
+MSGPACK_ERRORS = (msgpack.UnpackException,) if msgpack is not None else ()
+
+# Messages en attente par connexion ; au-delà, les plus anciens sont abandonnés
+WS_SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", 64))
+# Messages abandonnés tolérés avant de déconnecter un client trop lent
+WS_MAX_DROPPED = int(os.environ.get("WS_MAX_DROPPED", 256))
+# Connexions par worker ; au-delà, les nouvelles sont refusées (1013)
+WS_MAX_CONNECTIONS = int(os.environ.get("WS_MAX_CONNECTIONS", 20000))
+# Connexions simultanées par utilisateur ; la plus ancienne est fermée (1008)
+WS_MAX_CONNECTIONS_PER_USER = int(os.environ.get("WS_MAX_CONNECTIONS_PER_USER", 5))
+# Un envoi bloqué plus longtemps signale une connexion à demi ouverte
+WS_SEND_STALL_SECONDS = float(os.environ.get("WS_SEND_STALL_SECONDS", 30))
+# Une tâche d'envoi sans trame depuis ce délai est libérée
+WS_WRITER_IDLE_SECONDS = float(os.environ.get("WS_WRITER_IDLE_SECONDS", 60))
+WS_REAPER_INTERVAL_SECONDS = float(os.environ.get("WS_REAPER_INTERVAL_SECONDS", 10))
+# Abonnements explicites (delivery:{id}) par connexion
+WS_MAX_TOPICS = int(os.environ.get("WS_MAX_TOPICS", 100))
+# Fenêtre de regroupement maximale qu'un client peut demander
+WS_MAX_COALESCE_MS = int(os.environ.get("WS_MAX_COALESCE_MS", 2000))
+# Livraisons dont l'état envoyé est mémorisé par connexion pour les deltas
+WS_DELTA_STATE_SIZE = int(os.environ.get("WS_DELTA_STATE_SIZE", 256))
+
+# Derniers événements diffusés, rejoués à une connexion qui reprend sa session
+WS_REPLAY_BUFFER_SIZE = int(os.environ.get("WS_REPLAY_BUFFER_SIZE", 2000))
+# Au-delà, une reprise coûte plus cher qu'un rechargement de l'historique
+WS_REPLAY_MAX_EVENTS = int(os.environ.get("WS_REPLAY_MAX_EVENTS", 500))
+
+# Sous-protocoles négociés par Sec-WebSocket-Protocol, par ordre de préférence du client
+JSON_SUBPROTOCOL = "riganova.json"
+MSGPACK_SUBPROTOCOL = "riganova.msgpack"
+# Champs toujours présents dans un delta
+DELTA_KEYS = ("type", "delivery_id")
+
+MANAGERS_TOPIC = "managers"
+
+
+def delivery_topic(delivery_id: int) -> str:
+    return f"delivery:{delivery_id}"
+
+
+def client_topic(client_id: int) -> str:
+    return f"client:{client_id}"
+
+
+def livreur_topic(livreur_id: int) -> str:
+    return f"livreur:{livreur_id}"
+
+
+def delivery_topics(delivery_id: int, client_id: Optional[int] = None, livreur_id: Optional[int] = None) -> list[str]:
+    """Tous les publics d'un événement de livraison"""
+    topics = [delivery_topic(delivery_id), MANAGERS_TOPIC]
+    if client_id is not None:
+        topics.append(client_topic(client_id))
+    if livreur_id is not None:
+        topics.append(livreur_topic(livreur_id))
+    return topics
+
+
+class FrameOptions:
+    """Format des trames négocié par une connexion (par défaut : JSON complet, sans délai)"""
+
+    __slots__ = ("msgpack", "coalesce", "delta")
+
+    def __init__(self, msgpack: bool = False, coalesce_ms: int = 0, delta: bool = False):
+        self.msgpack = msgpack
+        self.coalesce = coalesce_ms / 1000
+        self.delta = delta
+
+    @property
+    def plain(self) -> bool:
+        return not (self.msgpack or self.coalesce or self.delta)
+
+
+PLAIN_FRAMES = FrameOptions()
+
+
+class Connection:
+    """Une socket et ses trames en attente d'envoi
+
+    Une connexion inactive ne garde que le strict nécessaire : la file
+    d'envoi et la tâche qui la vide sont créées au premier message et
+    libérées après WS_WRITER_IDLE_SECONDS sans trame ; l'état de regroupement
+    et des deltas n'est créé qu'à son premier usage.
+    """
+
+    __slots__ = (
+        "websocket", "frames", "writer", "wakeup", "sending_since", "idle_since", "dropped",
+        "user_id", "role", "topics", "options", "pending", "flush_handle", "sent_state",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: Optional[int] = None,
+        role: Optional[UserRole] = None,
+        options: FrameOptions = PLAIN_FRAMES,
+    ):
+        self.websocket = websocket
+        self.frames: Optional[deque] = None
+        self.writer: Optional[asyncio.Task] = None
+        # Futur sur lequel la tâche d'envoi attend la prochaine trame
+        self.wakeup: Optional[asyncio.Future] = None
+        # Début de l'envoi en cours / de l'attente (horloge de la boucle)
+        self.sending_since: Optional[float] = None
+        self.idle_since = 0.0
+        self.dropped = 0
+        self.user_id = user_id
+        self.role = role
+        self.topics: set = set()
+        self.options = options
+        # Messages retenus pendant la fenêtre de regroupement, par livraison
+        self.pending: Optional[dict] = None
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # Dernier état envoyé de chaque livraison (deltas)
+        self.sent_state: Optional[OrderedDict] = None
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Diffusion par sujets sans qu'un client lent ne bloque les autres
+
+    Chaque connexion est abonnée à des sujets (delivery:{id}, client:{id},
+    livreur:{id}, managers) ; un index sujet -> connexions limite le coût
+    d'une publication à ses abonnés. Le message est sérialisé une fois puis
+    déposé dans la file de chaque abonné ; l'envoi réel est fait par une
+    tâche par connexion, libérée quand la connexion reste inactive. Un client
+    dont la file déborde perd ses messages les plus anciens, puis est
+    déconnecté s'il n'en rattrape pas le rythme ; une socket morte est
+    retirée à sa première erreur d'envoi.
+
+    Une connexion peut négocier un format plus compact (voir FrameOptions) :
+    regroupement des messages d'une même livraison sur une fenêtre, deltas
+    (seuls les champs modifiés depuis le dernier envoi) et MessagePack. Ces
+    connexions sont encodées une à une ; les autres partagent la même trame.
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    Chaque événement diffusé reçoit un numéro de séquence croissant (seq),
+    propre à ce processus et identifié par son epoch ; les derniers sont
+    gardés pour être rejoués à une connexion qui reprend sa session.
+
+    Pas de délai d'expiration par envoi (un minuteur par message coûte autant
+    que l'envoi) : une tâche de fond ferme les connexions dont un envoi est
+    bloqué depuis WS_SEND_STALL_SECONDS. Les pings du protocole (serveur
+    uvicorn) ferment de leur côté les connexions à demi ouvertes inactives.
+
+    Le nombre de connexions est plafonné par worker et par utilisateur ; un
+    utilisateur au plafond perd sa plus ancienne connexion, souvent celle
+    qu'un téléphone a perdue sans la fermer.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        max_dropped: int = WS_MAX_DROPPED,
+        max_connections: int = WS_MAX_CONNECTIONS,
+        max_per_user: int = WS_MAX_CONNECTIONS_PER_USER,
+    ):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.topics: Dict[str, set] = {}
+        # user_id -> connexions, de la plus ancienne à la plus récente
+        self.by_user: Dict[int, list] = {}
+        # Boucle des connexions : les diffusions venant d'un autre thread y sont transférées
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.broadcasts = 0
+        self.sent = 0
+        self.dropped = 0
+        self.pruned = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.stalled = 0
+        # Séquence des événements ; l'epoch change à chaque démarrage du processus
+        self.epoch = uuid.uuid4().hex[:12]
+        self.sequence = 0
+        # (seq, sujets, message) des derniers événements
+        self.replay_buffer = deque(maxlen=WS_REPLAY_BUFFER_SIZE)
+        self.resumed = 0
+        self.resume_misses = 0
+
+    @property
+    def active_connections(self):
+        return list(self.connections)
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: Optional[int] = None,
+        role: Optional[UserRole] = None,
+        options: FrameOptions = PLAIN_FRAMES,
+        subprotocol: Optional[str] = None,
+    ) -> Optional[Connection]:
+        """Accepter une connexion ; None si le worker est au plafond (socket fermée)"""
+        if len(self.connections) >= self.max_connections:
+            self.rejected += 1
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return None
+        await websocket.accept(subprotocol=subprotocol)
+        self.loop = asyncio.get_running_loop()
+        connection = Connection(websocket, user_id, role, options)
+        self.connections[websocket] = connection
+        if user_id is not None:
+            connections = self.by_user.setdefault(user_id, [])
+            connections.append(connection)
+            while len(connections) > self.max_per_user:
+                self.evicted += 1
+                self._prune(connections[0], code=status.WS_1008_POLICY_VIOLATION)
+        return connection
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        for topic in connection.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.topics[topic]
+        connection.topics.clear()
+        connections = self.by_user.get(connection.user_id)
+        if connections is not None:
+            connections.remove(connection)
+            if not connections:
+                del self.by_user[connection.user_id]
+        if connection.flush_handle is not None:
+            connection.flush_handle.cancel()
+            connection.flush_handle = None
+        connection.frames = None
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    def subscribe(self, connection: Connection, topic: str):
+        if self.connections.get(connection.websocket) is not connection:
+            return
+        connection.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(connection)
+
+    def unsubscribe(self, connection: Connection, topic: str):
+        connection.topics.discard(topic)
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.topics[topic]
+
+    async def broadcast(self, message: Dict[str, Any], topics: Optional[Iterable[str]] = None):
+        self.publish(message, topics)
+
+    def publish(self, message: Dict[str, Any], topics: Optional[Iterable[str]] = None):
+        """Publier un message sur des sujets (toutes les connexions si topics est None)
 
-    async def broadcast(self, message: Dict[str, Any]):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        Utilisable depuis n'importe quel thread, ne bloque jamais.
+        """
+        loop = self.loop
+        if loop is None:
+            # Aucune connexion depuis le démarrage : aucune session à reprendre
+            return
+        topics = None if topics is None else tuple(topics)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(message, topics)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._fan_out, message, topics)
+            except RuntimeError:
+                # Boucle fermée (arrêt de l'application)
+                pass
+
+    def send(self, connection: Connection, message: Dict[str, Any]):
+        """Message destiné à une seule connexion, par la même file que les diffusions"""
+        self._enqueue(connection, self._encode(connection, message))
+
+    def _subscribers(self, topics: Optional[tuple]):
+        if topics is None:
+            return list(self.connections.values())
+        if len(topics) == 1:
+            return list(self.topics.get(topics[0], ()))
+        # Une connexion abonnée à plusieurs sujets ne reçoit le message qu'une fois
+        subscribers = set()
+        for topic in topics:
+            subscribers.update(self.topics.get(topic, ()))
+        return subscribers
+
+    def _fan_out(self, message: Dict[str, Any], topics: Optional[tuple] = None):
+        # Numérotation dans la boucle : l'ordre des seq est celui des envois
+        self.sequence += 1
+        message = {**message, "seq": self.sequence}
+        self.replay_buffer.append((self.sequence, topics, message))
+        self.broadcasts += 1
+        subscribers = self._subscribers(topics)
+        if not subscribers:
+            return
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        for connection in subscribers:
+            if connection.options.plain:
+                self._enqueue(connection, text)
+            elif connection.options.coalesce:
+                self._hold(connection, message)
+            elif self._make_room(connection):
+                # Place libérée avant le calcul du delta : un abandon remet l'état à zéro
+                self._enqueue(connection, self._encode(connection, self._delta(connection, message)))
+
+    def resume(self, connection: Connection, epoch: Optional[str], resume_from: Optional[int]):
+        """Annoncer la session, puis rejouer les événements manqués depuis resume_from
+
+        La connexion doit déjà être abonnée à ses sujets : abonnement et lecture
+        du tampon se font sans céder la main, donc sans trou ni doublon avec
+        les diffusions suivantes. "resumed": false demande au client de
+        recharger l'historique (autre processus, redémarrage ou retard trop
+        ancien).
+        """
+        missed = None
+        if resume_from is not None and epoch == self.epoch and resume_from <= self.sequence:
+            oldest = self.replay_buffer[0][0] if self.replay_buffer else self.sequence + 1
+            if resume_from >= oldest - 1 and self.sequence - resume_from <= WS_REPLAY_MAX_EVENTS:
+                missed = [
+                    message for seq, topics, message in self.replay_buffer
+                    if seq > resume_from and (topics is None or not connection.topics.isdisjoint(topics))
+                ]
+        resumed = missed is not None
+        if resume_from is not None:
+            if resumed:
+                self.resumed += 1
+            else:
+                self.resume_misses += 1
+        self.send(connection, {"type": "session", "epoch": self.epoch, "seq": self.sequence, "resumed": resumed})
+        if missed and self._make_room(connection):
+            events = [self._delta(connection, message) for message in missed]
+            self.send(connection, {"type": "replay", "events": events})
+
+    def _hold(self, connection: Connection, message: Dict[str, Any]):
+        """Retenir un message jusqu'à la fin de la fenêtre ; les messages d'une même livraison fusionnent"""
+        key = message.get("delivery_id")
+        if key is None:
+            # Message sans livraison (lots) : jamais fusionné, ordre conservé
+            key = object()
+        if connection.pending is None:
+            connection.pending = {}
+        previous = connection.pending.get(key)
+        if previous is None:
+            connection.pending[key] = message
+        else:
+            merged = {**previous, **message}
+            merged["merged"] = previous.get("merged", [previous["type"]]) + [message["type"]]
+            connection.pending[key] = merged
+            self.coalesced += 1
+        if connection.flush_handle is None:
+            connection.flush_handle = self.loop.call_later(connection.options.coalesce, self._flush, connection)
+
+    def _flush(self, connection: Connection):
+        connection.flush_handle = None
+        if not connection.pending or self.connections.get(connection.websocket) is not connection:
+            return
+        pending, connection.pending = connection.pending, None
+        if not self._make_room(connection):
+            return
+        messages = [self._delta(connection, message) for message in pending.values()]
+        payload = messages[0] if len(messages) == 1 else {"type": "batch", "events": messages}
+        self._enqueue(connection, self._encode(connection, payload))
+
+    @staticmethod
+    def _delta(connection: Connection, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Champs modifiés depuis le dernier envoi de cette livraison à cette connexion"""
+        delivery_id = message.get("delivery_id")
+        if not connection.options.delta or delivery_id is None:
+            return message
+        state = connection.sent_state
+        if state is None:
+            state = connection.sent_state = OrderedDict()
+        previous = state.get(delivery_id)
+        if previous is None:
+            if len(state) >= WS_DELTA_STATE_SIZE:
+                state.popitem(last=False)
+            state[delivery_id] = dict(message)
+            return message
+        state.move_to_end(delivery_id)
+        delta = {
+            key: value for key, value in message.items()
+            if key in DELTA_KEYS or previous.get(key) != value
+        }
+        previous.update(message)
+        return delta
+
+    @staticmethod
+    def _encode(connection: Connection, payload: Dict[str, Any]):
+        if connection.options.msgpack:
+            return msgpack.packb(payload, use_bin_type=True)
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+    def _make_room(self, connection: Connection) -> bool:
+        """Garantir une place dans la file ; False si la connexion a été fermée"""
+        frames = connection.frames
+        if frames is None or len(frames) < self.queue_size:
+            return True
+        if connection.options.delta:
+            # Les deltas en file supposent reçu le message abandonné : on vide toute
+            # la file et les messages suivants repartent complets
+            dropped = len(frames)
+            frames.clear()
+            connection.sent_state = None
+        else:
+            # Client lent : on sacrifie le message le plus ancien
+            frames.popleft()
+            dropped = 1
+        connection.dropped += dropped
+        self.dropped += dropped
+        if connection.dropped > self.max_dropped:
+            self._prune(connection, code=status.WS_1013_TRY_AGAIN_LATER)
+            return False
+        return True
+
+    def _enqueue(self, connection: Connection, frame):
+        frames = connection.frames
+        if frames is None:
+            if self.connections.get(connection.websocket) is not connection:
+                return
+            frames = connection.frames = deque()
+        elif not self._make_room(connection):
+            return
+        frames.append(frame)
+        if connection.writer is None:
+            connection.writer = self.loop.create_task(self._writer(connection, frames))
+        elif connection.wakeup is not None:
+            connection.wakeup.set_result(True)
+            connection.wakeup = None
+
+    async def _writer(self, connection: Connection, frames: deque):
+        websocket = connection.websocket
+        clock = self.loop.time
+        try:
+            while True:
+                while frames:
+                    frame = frames.popleft()
+                    connection.sending_since = clock()
+                    if isinstance(frame, bytes):
+                        await websocket.send_bytes(frame)
+                    else:
+                        await websocket.send_text(frame)
+                    self.sent += 1
+                connection.sending_since = None
+                connection.idle_since = clock()
+                connection.wakeup = self.loop.create_future()
+                if not await connection.wakeup:
+                    # Libérée par reap()
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket morte
+            self._prune(connection)
+        finally:
+            if connection.writer is asyncio.current_task():
+                connection.writer = None
+                connection.wakeup = None
+                connection.sending_since = None
+
+    def reap(self):
+        """Fermer les connexions dont un envoi est bloqué (pair disparu, tampon TCP
+        plein) et libérer les tâches d'envoi des connexions inactives"""
+        if self.loop is None:
+            return
+        now = self.loop.time()
+        stalled = now - WS_SEND_STALL_SECONDS
+        idle = now - WS_WRITER_IDLE_SECONDS
+        for connection in list(self.connections.values()):
+            if connection.sending_since is not None and connection.sending_since < stalled:
+                self.stalled += 1
+                self._prune(connection)
+            elif connection.wakeup is not None and connection.idle_since < idle:
+                connection.wakeup.set_result(False)
+                connection.wakeup = None
+                connection.writer = None
+                connection.frames = None
+
+    async def run_forever(self, interval: float = WS_REAPER_INTERVAL_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"WebSocket reaper error: {e}")
+
+    def _prune(self, connection: Connection, code: int = status.WS_1011_INTERNAL_ERROR):
+        if self.connections.get(connection.websocket) is not connection:
+            return
+        self.pruned += 1
+        self.disconnect(connection.websocket)
+        asyncio.get_running_loop().create_task(self._close(connection.websocket, code))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "topics": len(self.topics),
+            "broadcasts": self.broadcasts,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "pruned": self.pruned,
+            "coalesced": self.coalesced,
+            "users": len(self.by_user),
+            "writers": sum(1 for connection in self.connections.values() if connection.writer is not None),
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "stalled": self.stalled,
+            "seq": self.sequence,
+            "replay_buffer": len(self.replay_buffer),
+            "resumed": self.resumed,
+            "resume_misses": self.resume_misses,
+        }
 
 manager = ConnectionManager()
 
+
+def default_topics(user_id: int, role: UserRole) -> list[str]:
+    """Sujets auxquels une connexion est abonnée d'office selon le rôle"""
+    if role in (UserRole.MANAGER, UserRole.ADMIN):
+        return [MANAGERS_TOPIC]
+    if role == UserRole.LIVREUR:
+        return [livreur_topic(user_id)]
+    return [client_topic(user_id)]
+
+
+def _authenticate(token: str):
+    db = SessionLocal()
+    try:
+        user = user_from_token(db, token)
+        return (user.id, user.role) if user is not None else None
+    finally:
+        db.close()
+
+
+def _can_follow_delivery(user_id: int, role: UserRole, delivery_id: int) -> bool:
+    if role in (UserRole.MANAGER, UserRole.ADMIN):
+        return True
+    db = SessionLocal()
+    try:
+        delivery = (
+            db.query(Delivery.client_id, Delivery.livreur_id)
+            .filter(Delivery.id == delivery_id)
+            .first()
+        )
+    finally:
+        db.close()
+    if delivery is None:
+        return False
+    return user_id in (delivery.client_id, delivery.livreur_id)
+
+
+def _decode_command(connection: Connection, message: Dict[str, Any]):
+    """Trame texte JSON, ou binaire MessagePack sur une connexion msgpack"""
+    if message.get("text") is not None:
+        return json.loads(message["text"])
+    if message.get("bytes") is not None and connection.options.msgpack:
+        return msgpack.unpackb(message["bytes"], raw=False)
+    raise ValueError
+
+
+async def _handle_command(connection: Connection, message: Dict[str, Any]):
+    """{"action": "subscribe" | "unsubscribe", "topic": "delivery:{id}"}"""
+    try:
+        command = _decode_command(connection, message)
+        action, topic = command["action"], command["topic"]
+        kind, _, raw_id = topic.partition(":")
+        if kind != "delivery" or action not in ("subscribe", "unsubscribe"):
+            raise ValueError
+        delivery_id = int(raw_id)
+    except (ValueError, KeyError, TypeError, AttributeError, *MSGPACK_ERRORS):
+        manager.send(connection, {"type": "error", "detail": "Commande invalide"})
+        return
+
+    if action == "unsubscribe":
+        manager.unsubscribe(connection, topic)
+        manager.send(connection, {"type": "unsubscribed", "topic": topic})
+        return
+    if len(connection.topics) >= WS_MAX_TOPICS:
+        manager.send(connection, {"type": "error", "detail": f"Maximum {WS_MAX_TOPICS} abonnements"})
+        return
+    allowed = await asyncio.to_thread(_can_follow_delivery, connection.user_id, connection.role, delivery_id)
+    if not allowed:
+        manager.send(connection, {"type": "error", "topic": topic, "detail": "Accès refusé"})
+        return
+    manager.subscribe(connection, topic)
+    manager.send(connection, {"type": "subscribed", "topic": topic})
+
+
 # WebSocket endpoint for real-time delivery status updates
-from fastapi import APIRouter
 router = APIRouter()
 
+def negotiate_subprotocol(offered: list[str]) -> Optional[str]:
+    """Premier sous-protocole proposé par le client que le serveur sait produire"""
+    for subprotocol in offered:
+        if subprotocol == JSON_SUBPROTOCOL or (subprotocol == MSGPACK_SUBPROTOCOL and msgpack is not None):
+            return subprotocol
+    return None
+
+
 @router.websocket("/ws/deliveries")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str = Query(...),
+    coalesce_ms: int = Query(0, ge=0, le=WS_MAX_COALESCE_MS),
+    delta: bool = Query(False),
+    epoch: Optional[str] = Query(None),
+    resume_from: Optional[int] = Query(None, ge=0),
+):
+    """Delivery events for the authenticated user
+
+    Managers/admins follow every delivery, a client their own deliveries and a
+    livreur the deliveries assigned to them; any of them can also subscribe to
+    a single delivery they are allowed to see.
+
+    Optional compact frames: `coalesce_ms` merges the events of one delivery
+    within that window (several deliveries arrive as one "batch" frame),
+    `delta=true` sends only the fields that changed since the last frame for
+    that delivery, and the `riganova.msgpack` subprotocol switches to binary
+    MessagePack frames (commands may then be sent as JSON text or
+    MessagePack binary frames).
+    permessage-deflate is negotiated by the server.
+
+    The first frame is {"type": "session", "epoch", "seq", "resumed"}; every
+    event carries its `seq`. After a disconnect, reconnect with the last
+    `epoch` and `seq` seen (`epoch=...&resume_from=...`) to get the missed
+    events in one {"type": "replay"} frame. "resumed": false means they are
+    no longer available here and the client should reload its deliveries.
+    """
+    identity = await asyncio.to_thread(_authenticate, token)
+    if identity is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id, role = identity
+    subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    options = FrameOptions(
+        msgpack=subprotocol == MSGPACK_SUBPROTOCOL, coalesce_ms=coalesce_ms, delta=delta
+    )
+    if options.plain:
+        options = PLAIN_FRAMES
+    connection = await manager.connect(websocket, user_id, role, options, subprotocol)
+    if connection is None:
+        return
+    for topic in default_topics(user_id, role):
+        manager.subscribe(connection, topic)
+    manager.resume(connection, epoch, resume_from)
     try:
         while True:
-            await websocket.receive_text()  # Keep connection alive
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+            await _handle_command(connection, message)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
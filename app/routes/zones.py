@@ -1,14 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
 from sqlalchemy.orm import Session
 from app.database.database import get_db
 from app.auth.auth import get_current_user, get_admin_user
 from app.models.models import User
 from app.models.zone import DeliveryZone
 from app.models import UserRole
-from app.schemas.schemas import ZoneCreate, ZoneUpdate, Zone
+from app.schemas.schemas import ZoneCreate, ZoneUpdate, Zone, GeoPoint, ZoneResolution
+from app.services.pricing import zone_index
+from app.services.zone_cache import zone_list_cache
+from app.services.pubsub import broker, ZONES_CHANNEL
 
 router = APIRouter(prefix="/zones", tags=["zones"])
 
+MAX_RESOLVE_BATCH = 1000
+
+def _invalidate_zone_caches(data: Optional[dict] = None):
+    zone_index.invalidate()
+    zone_list_cache.invalidate()
+
+# Zone writes handled by another worker
+broker.subscribe(ZONES_CHANNEL, _invalidate_zone_caches)
+
+def _zones_changed():
+    """Invalidate the zone caches after a zone write, here and in every other worker"""
+    _invalidate_zone_caches()
+    broker.publish(ZONES_CHANNEL, {})
+
+def _zone_list_response(cache_control: str, if_none_match: Optional[str], if_modified_since: Optional[str]) -> Response:
+    """Serve the cached zone list, or 304 when the client copy is still current"""
+    cached = zone_list_cache.get()
+    headers = {"ETag": cached.etag, "Cache-Control": cache_control}
+    if cached.last_modified_header:
+        headers["Last-Modified"] = cached.last_modified_header
+    if cached.not_modified(if_none_match, if_modified_since):
+        zone_list_cache.record_not_modified()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @router.post("/", response_model=Zone)
 def create_zone(
     zone: ZoneCreate,
@@ -20,24 +49,59 @@ def create_zone(
     db.add(db_zone)
     db.commit()
     db.refresh(db_zone)
+    _zones_changed()
     return db_zone
 
 @router.get("/", response_model=list[Zone])
 def list_zones(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
 ):
     """List all active delivery zones"""
-    zones = db.query(DeliveryZone).filter(DeliveryZone.is_active == True).all()
-    return zones
+    return _zone_list_response("private, no-cache", if_none_match, if_modified_since)
 
 @router.get("/public", response_model=list[Zone])
 def list_zones_public(
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
 ):
     """Public endpoint: list all active delivery zones without authentication"""
-    zones = db.query(DeliveryZone).filter(DeliveryZone.is_active == True).all()
-    return zones
+    return _zone_list_response("public, no-cache", if_none_match, if_modified_since)
+
+def _resolution(lat: float, lon: float) -> ZoneResolution:
+    zone = zone_index.resolve(lat, lon)
+    if zone is None:
+        return ZoneResolution(lat=lat, lon=lon)
+    return ZoneResolution(lat=lat, lon=lon, zone_id=zone.id, nom_zone=zone.nom_zone, prix=zone.prix)
+
+@router.get("/resolve", response_model=ZoneResolution)
+def resolve_zone(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    current_user: User = Depends(get_current_user)
+):
+    """Find the delivery zone whose polygon contains a point"""
+    resolution = _resolution(lat, lon)
+    if resolution.zone_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Aucune zone ne couvre ce point"
+        )
+    return resolution
+
+@router.post("/resolve/batch", response_model=list[ZoneResolution])
+def resolve_zones_batch(
+    points: list[GeoPoint],
+    current_user: User = Depends(get_current_user)
+):
+    """Resolve many points at once; points outside every zone get a null zone_id"""
+    if len(points) > MAX_RESOLVE_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {MAX_RESOLVE_BATCH} points par requête"
+        )
+    return [_resolution(point.lat, point.lon) for point in points]
 
 @router.get("/{zone_id}", response_model=Zone)
 def get_zone(
@@ -75,6 +139,7 @@ def update_zone(
     
     db.commit()
     db.refresh(zone)
+    _zones_changed()
     return zone
 
 @router.delete("/{zone_id}")
@@ -93,4 +158,5 @@ def delete_zone(
     
     zone.is_active = False
     db.commit()
+    _zones_changed()
     return {"message": "Zone supprimée avec succès"}
@@ -1,8 +1,13 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Annotated, Optional
 from datetime import datetime
 from app.models import UserRole, DeliveryStatus, DeliveryType
 
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+# Anneau de points [lat, lon]
+PolygonPoints = Annotated[list[tuple[Latitude, Longitude]], Field(min_length=3)]
+
 # Schémas pour l'authentification
 class UserCreate(BaseModel):
     nom: str
@@ -39,19 +44,43 @@ class DeliveryCreate(BaseModel):
     description: Optional[str] = None
     adresse_pickup: str
     adresse_dropoff: str
+    pickup_lat: Optional[Latitude] = None
+    pickup_lon: Optional[Longitude] = None
+    dropoff_lat: Optional[Latitude] = None
+    dropoff_lon: Optional[Longitude] = None
 
 class DeliveryUpdate(BaseModel):
     statut: DeliveryStatus
+    expected_statut: Optional[DeliveryStatus] = None
 
 class DeliveryAssign(BaseModel):
     livreur_id: int
 
+class DeliveryBulkAssignItem(BaseModel):
+    delivery_id: int
+    livreur_id: int
+
+class DeliveryAssignResult(BaseModel):
+    delivery_id: int
+    livreur_id: int
+    success: bool
+    detail: Optional[str] = None
+
+class DeliveryBulkAssignResponse(BaseModel):
+    assigned: int
+    failed: int
+    results: list[DeliveryAssignResult]
+
 class Delivery(BaseModel):
     id: int
     type_colis: DeliveryType
     description: Optional[str]
     adresse_pickup: str
     adresse_dropoff: str
+    pickup_lat: Optional[float] = None
+    pickup_lon: Optional[float] = None
+    dropoff_lat: Optional[float] = None
+    dropoff_lon: Optional[float] = None
     statut: DeliveryStatus
     prix: int
     client_id: int
@@ -68,6 +97,10 @@ class DeliveryWithClientInfo(BaseModel):
     description: Optional[str]
     adresse_pickup: str
     adresse_dropoff: str
+    pickup_lat: Optional[float] = None
+    pickup_lon: Optional[float] = None
+    dropoff_lat: Optional[float] = None
+    dropoff_lon: Optional[float] = None
     statut: DeliveryStatus
     prix: int
     client_id: int
@@ -82,6 +115,10 @@ class DeliveryWithClientInfo(BaseModel):
     class Config:
         from_attributes = True
 
+class DeliveryPage(BaseModel):
+    items: list[DeliveryWithClientInfo]
+    next_cursor: Optional[str] = None
+
 class DeliveryWithUsers(Delivery):
     client: User
     livreur: Optional[User] = None
@@ -90,11 +127,13 @@ class DeliveryWithUsers(Delivery):
 class ZoneCreate(BaseModel):
     nom_zone: str
     area: str
+    polygon: Optional[PolygonPoints] = None
     prix: float
 
 class ZoneUpdate(BaseModel):
     nom_zone: Optional[str] = None
     area: Optional[str] = None
+    polygon: Optional[PolygonPoints] = None
     prix: Optional[float] = None
     is_active: Optional[bool] = None
 
@@ -102,6 +141,7 @@ class Zone(BaseModel):
     id: int
     nom_zone: str
     area: str
+    polygon: Optional[list[tuple[float, float]]] = None
     prix: float
     is_active: bool
     created_at: datetime
@@ -109,3 +149,49 @@ class Zone(BaseModel):
 
     class Config:
         from_attributes = True
+
+class GeoPoint(BaseModel):
+    lat: Latitude
+    lon: Longitude
+
+class ZoneResolution(BaseModel):
+    lat: float
+    lon: float
+    zone_id: Optional[int] = None
+    nom_zone: Optional[str] = None
+    prix: Optional[float] = None
+
+# Schémas pour les positions des livreurs
+class LocationPing(BaseModel):
+    lat: Latitude
+    lon: Longitude
+    recorded_at: Optional[datetime] = None  # Horodatage du téléphone, sinon réception
+
+class LocationBatchResult(BaseModel):
+    accepted: int
+
+class NearestLivreur(BaseModel):
+    livreur_id: int
+    nom: str
+    telephone: str
+    lat: float
+    lon: float
+    distance_km: float
+    active_deliveries: int
+    recorded_at: datetime
+
+# Schémas pour les tournées
+class RouteStop(BaseModel):
+    delivery_id: int
+    kind: str  # pickup | dropoff
+    lat: float
+    lon: float
+    adresse: Optional[str] = None
+    leg_km: float
+
+class RoutePlan(BaseModel):
+    livreur_id: int
+    origin: Optional[GeoPoint] = None
+    total_km: float
+    stops: list[RouteStop]
+    unplaced: list[int]  # Livraisons sans coordonnées
@@ -0,0 +1,82 @@
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+from app.models.models import User, Delivery
+from app.models import UserRole, DeliveryStatus
+from app.services.delivery_status import ASSIGNABLE_STATUSES
+from app.services.event_log import delivery_event, record_delivery_events, DELIVERY_ASSIGNED
+
+DELIVERY_NOT_FOUND = "Livraison introuvable"
+INVALID_LIVREUR = "Livreur invalide"
+NOT_ASSIGNABLE = "Statut incompatible avec une affectation"
+
+def assign_deliveries(db: Session, pairs: list[tuple[int, int]], sources: list = ASSIGNABLE_STATUSES) -> list[dict]:
+    """Assigner des livraisons à des livreurs en une seule requête UPDATE
+
+    `pairs` est une liste de (delivery_id, livreur_id). Tous les livreurs sont
+    validés en une requête, puis toutes les affectations valides sont appliquées
+    par un UPDATE ensembliste, limité aux livraisons encore affectables
+    (compare-and-set sur le statut), et journalisées dans delivery_events. Retourne un résultat par paire, dans l'ordre.
+    `sources` restreint les statuts de départ acceptés (l'auto-dispatch ne
+    reprend jamais une livraison affectée entre-temps par un manager).
+    Le commit reste à la charge de l'appelant.
+    """
+    results = [
+        {"delivery_id": delivery_id, "livreur_id": livreur_id, "success": False, "detail": None}
+        for delivery_id, livreur_id in pairs
+    ]
+
+    livreur_ids = {livreur_id for _, livreur_id in pairs}
+    valid_livreurs = {
+        row.id
+        for row in db.query(User.id).filter(
+            User.id.in_(livreur_ids),
+            User.role == UserRole.LIVREUR,
+        )
+    }
+
+    # Une seule affectation par livraison et par requête
+    to_assign = {}
+    for result in results:
+        if result["livreur_id"] not in valid_livreurs:
+            result["detail"] = INVALID_LIVREUR
+        elif result["delivery_id"] in to_assign:
+            result["detail"] = "Livraison en double dans la requête"
+        else:
+            to_assign[result["delivery_id"]] = result["livreur_id"]
+
+    # delivery_id -> client_id des livraisons affectées
+    assigned = {}
+    if to_assign:
+        rows = db.execute(
+            update(Delivery)
+            .where(
+                Delivery.id.in_(to_assign),
+                Delivery.statut.in_(sources),
+            )
+            .values(
+                livreur_id=case(to_assign, value=Delivery.id),
+                statut=DeliveryStatus.EN_ROUTE_PICKUP,
+            )
+            .returning(Delivery.id, Delivery.client_id, Delivery.livreur_id, Delivery.statut)
+            .execution_options(synchronize_session=False)
+        ).all()
+        assigned = {row.id: row.client_id for row in rows}
+        record_delivery_events(db, [delivery_event(DELIVERY_ASSIGNED, row) for row in rows])
+
+    # Diagnostic des échecs uniquement : introuvable ou statut incompatible
+    rejected = set(to_assign) - set(assigned)
+    existing = set()
+    if rejected:
+        existing = {row.id for row in db.query(Delivery.id).filter(Delivery.id.in_(rejected))}
+
+    for result in results:
+        if result["detail"] is not None:
+            continue
+        if result["delivery_id"] in assigned:
+            result["success"] = True
+            result["client_id"] = assigned[result["delivery_id"]]
+        elif result["delivery_id"] in existing:
+            result["detail"] = NOT_ASSIGNABLE
+        else:
+            result["detail"] = DELIVERY_NOT_FOUND
+    return results
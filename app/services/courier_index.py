@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func
+
+from app.database.database import SessionLocal
+from app.models.models import User, Delivery
+from app.models.location import CourierPosition
+from app.models import UserRole
+from app.services.dispatch import ACTIVE_STATUSES, DISPATCH_MAX_ACTIVE_PER_LIVREUR
+from app.services.geo import KM_PER_DEGREE_LAT, haversine_km
+
+COURIER_GRID_CELL_DEGREES = float(os.environ.get("COURIER_GRID_CELL_DEGREES", 0.01))
+# Une position plus ancienne ne rend plus le livreur visible
+COURIER_POSITION_MAX_AGE_SECONDS = float(os.environ.get("COURIER_POSITION_MAX_AGE_SECONDS", 300))
+COURIER_LOAD_REFRESH_SECONDS = float(os.environ.get("COURIER_LOAD_REFRESH_SECONDS", 10))
+# Rayon de recherche maximal, en cellules (~55 km avec des cellules de 0,01°)
+COURIER_SEARCH_MAX_RINGS = int(os.environ.get("COURIER_SEARCH_MAX_RINGS", 50))
+
+
+class CourierState:
+    __slots__ = ("livreur_id", "lat", "lon", "recorded_at", "seen_at", "cell")
+
+    def __init__(self, livreur_id: int):
+        self.livreur_id = livreur_id
+        self.lat = self.lon = None
+        self.recorded_at = None
+        self.seen_at = 0.0
+        self.cell = None
+
+
+class CourierIndex:
+    """Dernière position de chaque livreur, rangée dans une grille uniforme
+
+    Les positions arrivent de l'ingestion GPS ; la liste des livreurs et leur
+    nombre de livraisons en cours sont rechargés périodiquement en une requête.
+    Une recherche ne lit que la mémoire.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        cell_degrees: float = COURIER_GRID_CELL_DEGREES,
+        max_age: float = COURIER_POSITION_MAX_AGE_SECONDS,
+        max_active: int = DISPATCH_MAX_ACTIVE_PER_LIVREUR,
+    ):
+        self.session_factory = session_factory
+        self.cell_degrees = cell_degrees
+        self.max_age = max_age
+        self.max_active = max_active
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._couriers: dict[int, CourierState] = {}
+        self._cells: dict[tuple[int, int], set] = {}
+        # livreur_id -> (nom, téléphone, livraisons en cours)
+        self._roster: dict[int, tuple] = {}
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def update(self, livreur_id: int, lat: float, lon: float, recorded_at: datetime, seen_at: Optional[float] = None):
+        """Enregistrer une position si elle est plus récente que la précédente"""
+        with self._lock:
+            state = self._couriers.get(livreur_id)
+            if state is None:
+                state = self._couriers[livreur_id] = CourierState(livreur_id)
+            elif state.recorded_at is not None and recorded_at < state.recorded_at:
+                return
+            cell = self._cell(lat, lon)
+            if cell != state.cell:
+                if state.cell is not None:
+                    members = self._cells[state.cell]
+                    members.discard(livreur_id)
+                    if not members:
+                        del self._cells[state.cell]
+                self._cells.setdefault(cell, set()).add(livreur_id)
+                state.cell = cell
+            state.lat, state.lon, state.recorded_at = lat, lon, recorded_at
+            state.seen_at = time.monotonic() if seen_at is None else seen_at
+
+    def position(self, livreur_id: int) -> Optional[tuple[float, float]]:
+        """Dernière position connue et encore récente d'un livreur"""
+        with self._lock:
+            state = self._couriers.get(livreur_id)
+            if state is None or state.seen_at < time.monotonic() - self.max_age:
+                return None
+            return state.lat, state.lon
+
+    def refresh(self, now: Optional[datetime] = None):
+        """Recharger les livreurs et leur charge ; au premier appel, reprendre leurs dernières positions"""
+        now = now or datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(User.id, User.nom, User.telephone, func.count(Delivery.id).label("load"))
+                .outerjoin(
+                    Delivery,
+                    and_(Delivery.livreur_id == User.id, Delivery.statut.in_(ACTIVE_STATUSES)),
+                )
+                .filter(User.role == UserRole.LIVREUR)
+                .group_by(User.id)
+                .all()
+            )
+            positions = []
+            if self.refreshed_at is None:
+                latest = (
+                    db.query(CourierPosition.livreur_id, func.max(CourierPosition.recorded_at).label("recorded_at"))
+                    .filter(CourierPosition.recorded_at >= now - timedelta(seconds=self.max_age))
+                    .group_by(CourierPosition.livreur_id)
+                    .subquery()
+                )
+                positions = (
+                    db.query(CourierPosition.livreur_id, CourierPosition.lat, CourierPosition.lon, CourierPosition.recorded_at)
+                    .join(latest, and_(
+                        CourierPosition.livreur_id == latest.c.livreur_id,
+                        CourierPosition.recorded_at == latest.c.recorded_at,
+                    ))
+                    .all()
+                )
+        finally:
+            db.close()
+
+        roster = {row.id: (row.nom, row.telephone, row.load) for row in rows}
+        with self._lock:
+            self._roster = roster
+        for row in positions:
+            # Âge réel de la position, pas l'heure du rechargement
+            age = max((now - row.recorded_at).total_seconds(), 0.0)
+            self.update(row.livreur_id, row.lat, row.lon, row.recorded_at, seen_at=time.monotonic() - age)
+        self.refreshed_at = now
+
+    def nearest(self, lat: float, lon: float, k: int) -> list[dict]:
+        """Les k livreurs libres les plus proches, par anneaux de cellules croissants"""
+        oldest = time.monotonic() - self.max_age
+        row, col = self._cell(lat, lon)
+        # Distance minimale couverte par un anneau de cellules
+        km_per_ring = self.cell_degrees * KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01)
+        best = []  # tas max sur -distance
+        with self._lock:
+            roster = self._roster
+            remaining = len(self._cells)
+            for ring in range(COURIER_SEARCH_MAX_RINGS + 1):
+                if len(best) == k and -best[0][0] <= (ring - 1) * km_per_ring:
+                    break
+                if remaining == 0:
+                    break
+                for cell in self._ring(row, col, ring):
+                    members = self._cells.get(cell)
+                    if not members:
+                        continue
+                    remaining -= 1
+                    for livreur_id in members:
+                        state = self._couriers[livreur_id]
+                        info = roster.get(livreur_id)
+                        if info is None or info[2] >= self.max_active or state.seen_at < oldest:
+                            continue
+                        distance = haversine_km(lat, lon, state.lat, state.lon)
+                        entry = (-distance, livreur_id, state.lat, state.lon, state.recorded_at)
+                        if len(best) < k:
+                            heapq.heappush(best, entry)
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, entry)
+
+        results = []
+        for neg_distance, livreur_id, courier_lat, courier_lon, recorded_at in sorted(best, reverse=True):
+            nom, telephone, load = roster[livreur_id]
+            results.append({
+                "livreur_id": livreur_id,
+                "nom": nom,
+                "telephone": telephone,
+                "lat": courier_lat,
+                "lon": courier_lon,
+                "distance_km": round(-neg_distance, 3),
+                "active_deliveries": load,
+                "recorded_at": recorded_at,
+            })
+        return results
+
+    @staticmethod
+    def _ring(row: int, col: int, ring: int):
+        if ring == 0:
+            yield row, col
+            return
+        for d in range(-ring, ring + 1):
+            yield row - ring, col + d
+            yield row + ring, col + d
+        for d in range(-ring + 1, ring):
+            yield row + d, col - ring
+            yield row + d, col + ring
+
+    def stats(self) -> dict:
+        oldest = time.monotonic() - self.max_age
+        with self._lock:
+            visible = sum(1 for state in self._couriers.values() if state.seen_at >= oldest)
+            return {
+                "livreurs": len(self._roster),
+                "positioned": visible,
+                "cells": len(self._cells),
+                "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            }
+
+    async def run_forever(self, interval: float = COURIER_LOAD_REFRESH_SECONDS):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Courier index refresh error: {e}")
+            await asyncio.sleep(interval)
+
+
+courier_index = CourierIndex()
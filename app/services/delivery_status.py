@@ -0,0 +1,81 @@
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models.models import Delivery
+from app.models import DeliveryStatus
+
+# Transitions autorisées : statut courant -> statuts suivants possibles
+DELIVERY_TRANSITIONS = {
+    DeliveryStatus.EN_ATTENTE: {
+        DeliveryStatus.ASSIGNE,
+        DeliveryStatus.EN_ROUTE_PICKUP,
+        DeliveryStatus.ANNULE,
+    },
+    DeliveryStatus.ASSIGNE: {
+        DeliveryStatus.EN_ROUTE_PICKUP,
+        DeliveryStatus.ANNULE,
+    },
+    DeliveryStatus.EN_ROUTE_PICKUP: {
+        DeliveryStatus.ARRIVE_PICKUP,
+        DeliveryStatus.COLIS_RECUPERE,
+        DeliveryStatus.ANNULE,
+    },
+    DeliveryStatus.ARRIVE_PICKUP: {
+        DeliveryStatus.COLIS_RECUPERE,
+        DeliveryStatus.ANNULE,
+    },
+    DeliveryStatus.COLIS_RECUPERE: {
+        DeliveryStatus.EN_ROUTE_LIVRAISON,
+        DeliveryStatus.LIVRE,
+        DeliveryStatus.ANNULE,
+    },
+    DeliveryStatus.EN_ROUTE_LIVRAISON: {
+        DeliveryStatus.LIVRE,
+        DeliveryStatus.ANNULE,
+    },
+    DeliveryStatus.LIVRE: set(),
+    DeliveryStatus.ANNULE: set(),
+}
+
+# Une livraison peut être (ré)affectée tant que le colis n'est pas récupéré
+ASSIGNABLE_STATUSES = [
+    DeliveryStatus.EN_ATTENTE,
+    DeliveryStatus.ASSIGNE,
+    DeliveryStatus.EN_ROUTE_PICKUP,
+]
+
+
+def allowed_sources(target: DeliveryStatus) -> list[DeliveryStatus]:
+    """Statuts depuis lesquels `target` est atteignable"""
+    return [source for source, targets in DELIVERY_TRANSITIONS.items() if target in targets]
+
+
+def transition_delivery(
+    db: Session,
+    delivery_id: int,
+    target: DeliveryStatus,
+    expected: Optional[DeliveryStatus] = None,
+    conditions: tuple = (),
+) -> Optional[Delivery]:
+    """Appliquer une transition par compare-and-set
+
+    Une seule requête `UPDATE ... WHERE id = :id AND statut IN (:sources)
+    RETURNING ...` : aucun verrou n'est tenu pendant le code Python et deux
+    transitions concurrentes ne peuvent pas s'écraser. `expected` restreint la
+    source au statut lu par l'appelant ; `conditions` ajoute des filtres
+    (permissions). Retourne None si aucune ligne ne correspond, le diagnostic
+    (404, 403, 409...) reste à la charge de l'appelant.
+    """
+    sources = allowed_sources(target)
+    if expected is not None:
+        sources = [expected] if expected in sources else []
+    if not sources:
+        return None
+
+    return db.scalars(
+        update(Delivery)
+        .where(Delivery.id == delivery_id, Delivery.statut.in_(sources), *conditions)
+        .values(statut=target)
+        .returning(Delivery)
+        .execution_options(synchronize_session=False)
+    ).first()
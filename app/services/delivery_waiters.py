@@ -0,0 +1,84 @@
+import asyncio
+from typing import Optional
+
+
+class DeliveryWaiters:
+    """Requêtes en attente d'un changement sur une livraison (long-poll, SSE)
+
+    Une requête parquée ne tient ni connexion à la base ni thread : elle
+    attend un futur, réveillé quand un événement temps réel concerne sa
+    livraison (sur chaque worker, via le pub/sub). Le futur est créé avant la
+    lecture du statut, pour qu'un changement survenu entre les deux ne soit
+    pas manqué.
+    """
+
+    def __init__(self):
+        self._waiters: dict[int, set] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeups = 0
+        self.timeouts = 0
+
+    def watch(self, delivery_id: int) -> asyncio.Future:
+        self.loop = asyncio.get_running_loop()
+        future = self.loop.create_future()
+        self._waiters.setdefault(delivery_id, set()).add(future)
+        return future
+
+    def unwatch(self, delivery_id: int, future: asyncio.Future):
+        waiters = self._waiters.get(delivery_id)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[delivery_id]
+
+    async def wait(self, delivery_id: int, future: asyncio.Future, timeout: float) -> bool:
+        """True si la livraison a changé avant l'expiration du délai"""
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return False
+        finally:
+            self.unwatch(delivery_id, future)
+
+    def wake(self, delivery_id: int):
+        """Réveiller les requêtes d'une livraison ; utilisable depuis n'importe quel thread"""
+        loop = self.loop
+        if loop is None or delivery_id not in self._waiters:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake(delivery_id)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._wake, delivery_id)
+            except RuntimeError:
+                pass
+
+    def _wake(self, delivery_id: int):
+        for future in self._waiters.pop(delivery_id, ()):
+            if not future.done():
+                future.set_result(None)
+                self.wakeups += 1
+
+    def wake_for_message(self, data: dict):
+        """Abonné au canal WebSocket : réveiller les livraisons citées par un événement"""
+        message = data["message"]
+        if "delivery_id" in message:
+            self.wake(message["delivery_id"])
+        for assignment in message.get("assignments", ()):
+            self.wake(assignment["delivery_id"])
+
+    def stats(self) -> dict:
+        return {
+            "deliveries": len(self._waiters),
+            "waiters": sum(len(waiters) for waiters in self._waiters.values()),
+            "wakeups": self.wakeups,
+            "timeouts": self.timeouts,
+        }
+
+delivery_waiters = DeliveryWaiters()
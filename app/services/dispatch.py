@@ -0,0 +1,353 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import and_, func, text
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models.models import User, Delivery
+from app.models import UserRole, DeliveryStatus
+from app.services.assignments import assign_deliveries
+from app.services.geo import haversine_km_matrix
+
+AUTO_DISPATCH_ENABLED = os.environ.get("AUTO_DISPATCH_ENABLED", "false").lower() == "true"
+AUTO_DISPATCH_INTERVAL_SECONDS = float(os.environ.get("AUTO_DISPATCH_INTERVAL_SECONDS", 15))
+DISPATCH_STRATEGY = os.environ.get("DISPATCH_STRATEGY", "hungarian")
+DISPATCH_BATCH_SIZE = int(os.environ.get("DISPATCH_BATCH_SIZE", 1000))
+DISPATCH_MAX_ACTIVE_PER_LIVREUR = int(os.environ.get("DISPATCH_MAX_ACTIVE_PER_LIVREUR", 1))
+# Distance comptée quand le point de collecte ou la position du livreur est inconnu
+DISPATCH_MISSING_DISTANCE_KM = float(os.environ.get("DISPATCH_MISSING_DISTANCE_KM", 10))
+
+# Statuts pendant lesquels une livraison occupe son livreur
+ACTIVE_STATUSES = [
+    DeliveryStatus.ASSIGNE,
+    DeliveryStatus.EN_ROUTE_PICKUP,
+    DeliveryStatus.ARRIVE_PICKUP,
+    DeliveryStatus.COLIS_RECUPERE,
+    DeliveryStatus.EN_ROUTE_LIVRAISON,
+]
+
+# Clé du verrou consultatif qui garantit un seul dispatch à la fois entre workers
+DISPATCH_LOCK_KEY = 726_001
+
+
+class DispatchSnapshot:
+    """Vue figée des livraisons en attente et des livreurs disponibles
+
+    Coordonnées inconnues : None ou NaN.
+    """
+
+    def __init__(
+        self,
+        delivery_ids,
+        wait_seconds,
+        livreur_ids,
+        livreur_load,
+        pickup_lat=None,
+        pickup_lon=None,
+        livreur_lat=None,
+        livreur_lon=None,
+    ):
+        self.delivery_ids = np.asarray(delivery_ids, dtype=np.int64)
+        self.wait_seconds = np.asarray(wait_seconds, dtype=np.float64)
+        self.livreur_ids = np.asarray(livreur_ids, dtype=np.int64)
+        self.livreur_load = np.asarray(livreur_load, dtype=np.float64)
+        self.pickup_lat = self._coordinates(pickup_lat, len(self.delivery_ids))
+        self.pickup_lon = self._coordinates(pickup_lon, len(self.delivery_ids))
+        self.livreur_lat = self._coordinates(livreur_lat, len(self.livreur_ids))
+        self.livreur_lon = self._coordinates(livreur_lon, len(self.livreur_ids))
+
+    @staticmethod
+    def _coordinates(values, size: int) -> np.ndarray:
+        if values is None:
+            return np.full(size, np.nan)
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+class DispatchCost:
+    """Coût = distance livreur -> collecte + charge du livreur - ancienneté de la demande
+
+    Exprimé en minutes : chaque kilomètre jusqu'au point de collecte coûte
+    distance_weight, chaque livraison en cours workload_weight, chaque minute
+    d'attente de la demande rapporte wait_weight. Seule la distance dépend de
+    la paire (livraison, livreur) : c'est elle qui décide qui prend quoi ; la
+    charge et l'attente choisissent quels livreurs et quelles demandes passent
+    en premier. Un point inconnu compte pour missing_distance_km.
+    """
+
+    def __init__(
+        self,
+        distance_weight: float = 3.0,
+        workload_weight: float = 10.0,
+        wait_weight: float = 1.0,
+        missing_distance_km: float = DISPATCH_MISSING_DISTANCE_KM,
+    ):
+        self.distance_weight = distance_weight
+        self.workload_weight = workload_weight
+        self.wait_weight = wait_weight
+        self.missing_distance_km = missing_distance_km
+
+    def __call__(self, snapshot: DispatchSnapshot) -> np.ndarray:
+        distance_km = haversine_km_matrix(
+            snapshot.pickup_lat, snapshot.pickup_lon, snapshot.livreur_lat, snapshot.livreur_lon
+        )
+        distance_km[np.isnan(distance_km)] = self.missing_distance_km
+        wait_minutes = snapshot.wait_seconds / 60.0
+        return (
+            self.distance_weight * distance_km
+            + self.workload_weight * snapshot.livreur_load[np.newaxis, :]
+            - self.wait_weight * wait_minutes[:, np.newaxis]
+        )
+
+
+class GreedyMatcher:
+    """Affectation gloutonne : paires prises par coût croissant"""
+
+    def solve(self, cost: np.ndarray) -> list[tuple[int, int]]:
+        n_rows, n_cols = cost.shape
+        limit = min(n_rows, n_cols)
+        order = np.argsort(cost, axis=None, kind="stable")
+        rows, cols = np.unravel_index(order, cost.shape)
+        row_used = np.zeros(n_rows, dtype=bool)
+        col_used = np.zeros(n_cols, dtype=bool)
+        pairs = []
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            if row_used[row] or col_used[col]:
+                continue
+            row_used[row] = col_used[col] = True
+            pairs.append((row, col))
+            if len(pairs) == limit:
+                break
+        return sorted(pairs)
+
+
+class HungarianMatcher:
+    """Affectation optimale (algorithme hongrois, chemins augmentants)
+
+    Boucle interne vectorisée sur les colonnes : O(n² m) pour n <= m.
+    """
+
+    def solve(self, cost: np.ndarray) -> list[tuple[int, int]]:
+        if cost.size == 0:
+            return []
+        transposed = cost.shape[0] > cost.shape[1]
+        matrix = cost.T if transposed else cost
+        n, m = matrix.shape
+        columns = np.arange(m)
+        if m > n:
+            # Il existe une solution optimale où chaque ligne prend l'une de ses
+            # n colonnes les moins chères : on écarte toutes les autres colonnes
+            cheapest = np.argpartition(matrix, n - 1, axis=1)[:, :n]
+            columns = np.unique(cheapest)
+            matrix = matrix[:, columns]
+        pairs = self._solve_rows_le_cols(np.ascontiguousarray(matrix, dtype=np.float64))
+        pairs = [(row, int(columns[col])) for row, col in pairs]
+        if transposed:
+            pairs = [(col, row) for row, col in pairs]
+        return sorted(pairs)
+
+    @staticmethod
+    def _solve_rows_le_cols(cost: np.ndarray) -> list[tuple[int, int]]:
+        n, m = cost.shape
+        u = np.zeros(n + 1)
+        v = np.zeros(m + 1)
+        # p[j] : ligne (1-indexée) affectée à la colonne j, 0 si libre
+        p = np.zeros(m + 1, dtype=np.int64)
+        way = np.zeros(m + 1, dtype=np.int64)
+
+        # Réduction lignes (et colonnes si la matrice est carrée : sinon une
+        # colonne laissée libre doit garder un potentiel nul), puis affectation
+        # initiale sur les arêtes de coût réduit nul. Seules les lignes restantes
+        # cherchent ensuite un chemin augmentant.
+        u[1:] = cost.min(axis=1)
+        if n == m:
+            v[1:] = (cost - u[1:, np.newaxis]).min(axis=0)
+        tight = (cost - u[1:, np.newaxis] - v[np.newaxis, 1:]) <= 1e-9
+        unmatched = []
+        for i in range(1, n + 1):
+            candidates = np.flatnonzero(tight[i - 1] & (p[1:] == 0))
+            if len(candidates):
+                p[candidates[0] + 1] = i
+            else:
+                unmatched.append(i)
+
+        for i in unmatched:
+            p[0] = i
+            j0 = 0
+            minv = np.full(m + 1, np.inf)
+            used = np.zeros(m + 1, dtype=bool)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                free = ~used[1:]
+                reduced = cost[i0 - 1] - u[i0] - v[1:]
+                improve = free & (reduced < minv[1:])
+                minv[1:][improve] = reduced[improve]
+                way[1:][improve] = j0
+                candidates = np.where(free, minv[1:], np.inf)
+                j1 = int(np.argmin(candidates)) + 1
+                delta = candidates[j1 - 1]
+                used_cols = np.flatnonzero(used)
+                u[p[used_cols]] += delta
+                v[used_cols] -= delta
+                minv[1:][free] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            while j0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+
+        return [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+MATCHERS = {
+    "greedy": GreedyMatcher,
+    "hungarian": HungarianMatcher,
+}
+
+
+class DispatchEngine:
+    """Affecte périodiquement les livraisons EN_ATTENTE aux livreurs disponibles"""
+
+    def __init__(
+        self,
+        matcher=None,
+        cost_model=None,
+        session_factory=SessionLocal,
+        batch_size: int = DISPATCH_BATCH_SIZE,
+        max_active_per_livreur: int = DISPATCH_MAX_ACTIVE_PER_LIVREUR,
+        locate=None,
+    ):
+        self.matcher = matcher or MATCHERS[DISPATCH_STRATEGY]()
+        self.cost_model = cost_model or DispatchCost()
+        self.session_factory = session_factory
+        # livreur_id -> (lat, lon) ou None ; par défaut l'index des positions GPS
+        self.locate = locate
+        self.batch_size = batch_size
+        self.max_active_per_livreur = max_active_per_livreur
+
+    def snapshot(self, db: Session, now: Optional[datetime] = None) -> DispatchSnapshot:
+        now = now or datetime.now(timezone.utc)
+        pending = (
+            db.query(Delivery.id, Delivery.created_at, Delivery.pickup_lat, Delivery.pickup_lon)
+            .filter(Delivery.statut == DeliveryStatus.EN_ATTENTE)
+            .order_by(Delivery.created_at, Delivery.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        livreurs = (
+            db.query(User.id, func.count(Delivery.id).label("load"))
+            .outerjoin(
+                Delivery,
+                and_(Delivery.livreur_id == User.id, Delivery.statut.in_(ACTIVE_STATUSES)),
+            )
+            .filter(User.role == UserRole.LIVREUR)
+            .group_by(User.id)
+            .order_by(User.id)
+            .all()
+        )
+        available = [row for row in livreurs if row.load < self.max_active_per_livreur]
+        locate = self.locate
+        if locate is None:
+            # Import tardif : courier_index dépend de ce module
+            from app.services.courier_index import courier_index
+            locate = courier_index.position
+        positions = [locate(row.id) or (None, None) for row in available]
+
+        def waited(created_at):
+            if created_at is None:
+                return 0.0
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            return max((now - created_at).total_seconds(), 0.0)
+
+        return DispatchSnapshot(
+            delivery_ids=[row.id for row in pending],
+            wait_seconds=[waited(row.created_at) for row in pending],
+            livreur_ids=[row.id for row in available],
+            livreur_load=[row.load for row in available],
+            pickup_lat=[row.pickup_lat for row in pending],
+            pickup_lon=[row.pickup_lon for row in pending],
+            livreur_lat=[lat for lat, _ in positions],
+            livreur_lon=[lon for _, lon in positions],
+        )
+
+    def plan(self, snapshot: DispatchSnapshot) -> list[tuple[int, int]]:
+        """Paires (delivery_id, livreur_id) proposées pour un instantané"""
+        if not len(snapshot.delivery_ids) or not len(snapshot.livreur_ids):
+            return []
+        cost = self.cost_model(snapshot)
+        return [
+            (int(snapshot.delivery_ids[row]), int(snapshot.livreur_ids[col]))
+            for row, col in self.matcher.solve(cost)
+        ]
+
+    def run_once(self, now: Optional[datetime] = None) -> list[dict]:
+        """Un tour de dispatch ; retourne les affectations réussies"""
+        db = self.session_factory()
+        try:
+            if db.bind.dialect.name == "postgresql":
+                locked = db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": DISPATCH_LOCK_KEY}
+                ).scalar()
+                if not locked:
+                    return []
+            pairs = self.plan(self.snapshot(db, now))
+            if not pairs:
+                return []
+            # Même chemin d'écriture que l'affectation manuelle, limité aux livraisons
+            # encore en attente : une affectation manuelle depuis l'instantané est conservée
+            results = assign_deliveries(db, pairs, sources=[DeliveryStatus.EN_ATTENTE])
+            db.commit()
+            return [result for result in results if result["success"]]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run_forever(self, interval: float = AUTO_DISPATCH_INTERVAL_SECONDS):
+        from app.routes.websockets import delivery_topics, MANAGERS_TOPIC
+        from app.services.event_bus import event_bus, DeliveryNotification
+
+        while True:
+            try:
+                assigned = await asyncio.to_thread(self.run_once)
+                if assigned:
+                    message = {
+                        "type": "assigned_bulk",
+                        "source": "dispatch",
+                        "assignments": [
+                            {
+                                "delivery_id": result["delivery_id"],
+                                "livreur_id": result["livreur_id"],
+                                "status": DeliveryStatus.EN_ROUTE_PICKUP.value,
+                            }
+                            for result in assigned
+                        ],
+                    }
+                    event_bus.publish(DeliveryNotification(message, [MANAGERS_TOPIC]))
+                    # Le client et le livreur de chaque livraison ne reçoivent que la leur
+                    for result in assigned:
+                        event_bus.publish(DeliveryNotification(
+                            {
+                                "type": "assigned",
+                                "delivery_id": result["delivery_id"],
+                                "livreur_id": result["livreur_id"],
+                                "status": DeliveryStatus.EN_ROUTE_PICKUP.value,
+                            },
+                            delivery_topics(result["delivery_id"], result["client_id"], result["livreur_id"]),
+                        ))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Dispatch error: {e}")
+            await asyncio.sleep(interval)
+
+
+dispatch_engine = DispatchEngine()
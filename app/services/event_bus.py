@@ -0,0 +1,156 @@
+import asyncio
+import inspect
+import os
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Événements en attente de répartition ; au-delà, les nouveaux sont abandonnés
+EVENT_BUS_QUEUE_SIZE = int(os.environ.get("EVENT_BUS_QUEUE_SIZE", 10000))
+# Délai laissé aux envois en cours (e-mails) à l'arrêt
+EVENT_BUS_SHUTDOWN_TIMEOUT_SECONDS = float(os.environ.get("EVENT_BUS_SHUTDOWN_TIMEOUT_SECONDS", 5))
+# Fenêtre des mesures de latence exposées dans /stats
+LATENCY_SAMPLES = 1000
+
+
+class DomainEvent:
+    """Événement métier publié par une route ou un service"""
+
+    __slots__ = ("published_at",)
+
+    def __init__(self):
+        self.published_at = time.perf_counter()
+
+
+class DeliveryNotification(DomainEvent):
+    """Message temps réel d'une livraison, publié après son commit"""
+
+    __slots__ = ("message", "topics")
+
+    def __init__(self, message: dict, topics: Optional[list[str]] = None):
+        super().__init__()
+        self.message = message
+        self.topics = topics
+
+
+class UserRegistered(DomainEvent):
+    __slots__ = ("email", "nom", "telephone")
+
+    def __init__(self, email: str, nom: str, telephone: str):
+        super().__init__()
+        self.email = email
+        self.nom = nom
+        self.telephone = telephone
+
+
+class EventBus:
+    """Bus d'événements de l'application, vidé par une seule tâche
+
+    publish() peut être appelé depuis les routes synchrones (threads du pool)
+    comme depuis la boucle : l'événement est transféré dans une file asyncio.
+    La tâche de répartition appelle chaque gestionnaire abonné au type de
+    l'événement. Un gestionnaire synchrone (diffusion WebSocket) est appelé
+    directement ; une coroutine (e-mail) est lancée dans sa propre
+    tâche pour qu'un appel HTTP lent ne retarde pas les événements suivants.
+    """
+
+    def __init__(self, queue_size: int = EVENT_BUS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.handlers: dict[type, list[Callable]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self._inflight: set = set()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.published = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def subscribe(self, event_type: type, handler: Callable):
+        handlers = self.handlers.setdefault(event_type, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def publish(self, event: DomainEvent):
+        """Déposer un événement ; ne bloque jamais, utilisable depuis n'importe quel thread"""
+        loop = self.loop
+        if loop is None:
+            # Bus non démarré (script, application sans lifespan)
+            self.dropped += 1
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._put(event)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._put, event)
+            except RuntimeError:
+                # Boucle fermée (arrêt de l'application)
+                self.dropped += 1
+
+    def _put(self, event: DomainEvent):
+        try:
+            self.queue.put_nowait(event)
+            self.published += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Event bus full, dropping {type(event).__name__}")
+
+    def _dispatch(self, event: DomainEvent):
+        self._latencies.append(time.perf_counter() - event.published_at)
+        self.dispatched += 1
+        for handler in self.handlers.get(type(event), ()):
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self._inflight.add(task)
+                    task.add_done_callback(self._handler_done)
+            except Exception as e:
+                self.errors += 1
+                print(f"Event handler error ({type(event).__name__}): {e}")
+
+    def _handler_done(self, task: asyncio.Task):
+        self._inflight.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            print(f"Event handler error: {task.exception()}")
+
+    async def run_forever(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        try:
+            while True:
+                self._dispatch(await self.queue.get())
+        finally:
+            # Répartir ce qui reste, puis laisser un délai aux envois en cours
+            self.loop = None
+            while not self.queue.empty():
+                self._dispatch(self.queue.get_nowait())
+            if self._inflight:
+                await asyncio.wait(set(self._inflight), timeout=EVENT_BUS_SHUTDOWN_TIMEOUT_SECONDS)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        if latencies:
+            latency = {
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+                "max_ms": round(latencies[-1] * 1000, 3),
+            }
+        else:
+            latency = None
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "published": self.published,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+            "dispatch_latency": latency,
+        }
+
+event_bus = EventBus()
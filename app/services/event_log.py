@@ -0,0 +1,173 @@
+import asyncio
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models.event import DeliveryEvent
+from app.services.webhook_outbox import enqueue_webhooks, webhook_payload
+
+EVENT_PARTITIONS_AHEAD = int(os.environ.get("EVENT_PARTITIONS_AHEAD", 2))
+# 0 = conserver toutes les partitions
+EVENT_RETENTION_MONTHS = int(os.environ.get("EVENT_RETENTION_MONTHS", 12))
+EVENT_MAINTENANCE_INTERVAL_SECONDS = 24 * 3600
+
+DELIVERY_CREATED = "delivery_created"
+DELIVERY_ASSIGNED = "delivery_assigned"
+DELIVERY_STATUS_CHANGED = "delivery_status_changed"
+DELIVERY_CANCELLED = "delivery_cancelled"
+
+PARTITION_NAME = re.compile(r"^delivery_events_y(\d{4})m(\d{2})$")
+
+
+def delivery_event(event_type: str, delivery, **payload) -> dict:
+    """Ligne du journal pour une livraison (objet ORM ou ligne RETURNING)"""
+    return {
+        "event_type": event_type,
+        "delivery_id": delivery.id,
+        "client_id": delivery.client_id,
+        "livreur_id": delivery.livreur_id,
+        "statut": delivery.statut,
+        "payload": payload or None,
+    }
+
+
+def record_delivery_events(db: Session, events: list[dict]):
+    """Ajouter des événements dans la transaction courante (un seul INSERT multi-lignes)
+
+    Le commit reste à la charge de l'appelant : l'événement, et les webhooks
+    de ses abonnés (webhook_outbox), sont écrits dans le même commit que la
+    modification de la livraison.
+    """
+    if not events:
+        return
+    rows = db.execute(
+        insert(DeliveryEvent).returning(DeliveryEvent.id, DeliveryEvent.created_at, sort_by_parameter_order=True),
+        events,
+    ).all()
+    enqueue_webhooks(db, [webhook_payload(event, row.id, row.created_at) for event, row in zip(events, rows)])
+
+
+def _month_start(year: int, month: int) -> date:
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return date(year, month, 1)
+
+
+def ensure_event_partitions(db: Session, today: Optional[date] = None, months_ahead: int = EVENT_PARTITIONS_AHEAD) -> list[str]:
+    """Créer les partitions mensuelles du mois courant et des mois suivants
+
+    Si la maintenance s'est arrêtée plus longtemps que l'avance, les
+    événements du mois sont déjà dans delivery_events_default et PostgreSQL
+    refuse de créer la partition : ils y sont alors déplacés (voir
+    _create_partition_from_default). Chaque mois est traité dans sa propre
+    transaction ; un échec est signalé sans empêcher les mois suivants.
+    Retourne les partitions en échec.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    failed = []
+    for offset in range(months_ahead + 1):
+        start = _month_start(today.year, today.month + offset)
+        end = _month_start(start.year, start.month + 1)
+        name = f"delivery_events_y{start.year:04d}m{start.month:02d}"
+        bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        try:
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                continue
+            in_default = db.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM delivery_events_default "
+                f"WHERE created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}')"
+            )).scalar()
+            if in_default:
+                moved = _create_partition_from_default(db, name, start, end)
+                print(f"Partition {name} créée, {moved} événements repris de delivery_events_default")
+            else:
+                db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF delivery_events FOR VALUES {bounds}"))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            failed.append(name)
+            print(f"Partition {name} non créée: {e}")
+    return failed
+
+
+def _create_partition_from_default(db: Session, name: str, start: date, end: date) -> int:
+    """Créer la partition d'un mois dont les lignes sont dans la partition par défaut
+
+    La partition par défaut est détachée le temps de déplacer les lignes
+    (les écritures du journal attendent la fin de la transaction), puis
+    rattachée. Le commit reste à la charge de l'appelant.
+    """
+    db.execute(text("ALTER TABLE delivery_events DETACH PARTITION delivery_events_default"))
+    db.execute(text(
+        f"CREATE TABLE {name} PARTITION OF delivery_events "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    moved = db.execute(text(
+        f"WITH moved AS ("
+        f"DELETE FROM delivery_events_default "
+        f"WHERE created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}' RETURNING *"
+        f") INSERT INTO {name} SELECT * FROM moved"
+    )).rowcount
+    db.execute(text("ALTER TABLE delivery_events ATTACH PARTITION delivery_events_default DEFAULT"))
+    return moved
+
+
+def drop_event_partitions(db: Session, today: Optional[date] = None, retention_months: int = EVENT_RETENTION_MONTHS) -> list[str]:
+    """Supprimer les partitions entièrement antérieures à la rétention
+
+    Détacher puis supprimer une partition est instantané, contrairement à un
+    DELETE sur la table.
+    """
+    if retention_months <= 0:
+        return []
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = _month_start(today.year, today.month - retention_months)
+    partitions = db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "WHERE parent.relname = 'delivery_events'"
+    )).scalars().all()
+
+    dropped = []
+    for name in partitions:
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        start = date(int(match.group(1)), int(match.group(2)), 1)
+        if _month_start(start.year, start.month + 1) <= cutoff:
+            db.execute(text(f"ALTER TABLE delivery_events DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    db.commit()
+    return dropped
+
+
+def maintain_event_partitions():
+    db = SessionLocal()
+    try:
+        if db.bind.dialect.name != "postgresql":
+            return
+        ensure_event_partitions(db)
+        dropped = drop_event_partitions(db)
+        if dropped:
+            print(f"Partitions d'événements supprimées: {', '.join(dropped)}")
+    finally:
+        db.close()
+
+
+async def run_partition_maintenance(interval: float = EVENT_MAINTENANCE_INTERVAL_SECONDS):
+    """Maintenance quotidienne des partitions du journal d'événements"""
+    while True:
+        try:
+            await asyncio.to_thread(maintain_event_partitions)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Event partition maintenance error: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,106 @@
+import math
+import os
+from typing import Optional
+
+import numpy as np
+
+# Taille d'une cellule de la grille des zones, en degrés (~1,1 km)
+ZONE_GRID_CELL_DEGREES = float(os.environ.get("ZONE_GRID_CELL_DEGREES", 0.01))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_km_matrix(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """Distances (km) entre chaque point 1 (lignes) et chaque point 2 (colonnes) ; NaN si un point manque"""
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, np.newaxis]
+    lon1 = np.radians(np.asarray(lons1, dtype=np.float64))[:, np.newaxis]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[np.newaxis, :]
+    lon2 = np.radians(np.asarray(lons2, dtype=np.float64))[np.newaxis, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class Polygon:
+    """Polygone simple en coordonnées [lat, lon] (anneau ouvert ou fermé)"""
+
+    __slots__ = ("lats", "lons", "min_lat", "min_lon", "max_lat", "max_lon", "area")
+
+    def __init__(self, points):
+        points = [(float(lat), float(lon)) for lat, lon in points]
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        if len(points) < 3:
+            raise ValueError("Un polygone doit avoir au moins 3 sommets")
+        self.lats = [lat for lat, _ in points]
+        self.lons = [lon for _, lon in points]
+        self.min_lat, self.max_lat = min(self.lats), max(self.lats)
+        self.min_lon, self.max_lon = min(self.lons), max(self.lons)
+        # Aire plane (formule du lacet), sert seulement à départager des zones imbriquées
+        self.area = abs(sum(
+            self.lons[i - 1] * self.lats[i] - self.lons[i] * self.lats[i - 1]
+            for i in range(len(points))
+        )) / 2
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Test par lancer de rayon ; un point sur le bord peut tomber d'un côté ou de l'autre"""
+        if not (self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon):
+            return False
+        lats, lons = self.lats, self.lons
+        inside = False
+        j = len(lats) - 1
+        for i in range(len(lats)):
+            lat_i, lat_j = lats[i], lats[j]
+            if (lat_i > lat) != (lat_j > lat):
+                crossing = lons[i] + (lat - lat_i) * (lons[j] - lons[i]) / (lat_j - lat_i)
+                if lon < crossing:
+                    inside = not inside
+            j = i
+        return inside
+
+
+class PolygonGrid:
+    """Grille uniforme : cellule -> polygones dont l'emprise touche la cellule
+
+    Une recherche ne teste que les quelques polygones de la cellule du point,
+    le plus petit d'abord pour que la zone la plus précise l'emporte.
+    """
+
+    def __init__(self, items, cell_degrees: float = ZONE_GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        cells = {}
+        for value, polygon in items:
+            for row in range(self._cell(polygon.min_lat), self._cell(polygon.max_lat) + 1):
+                for col in range(self._cell(polygon.min_lon), self._cell(polygon.max_lon) + 1):
+                    cells.setdefault((row, col), []).append((polygon, value))
+        self.cells = {
+            key: tuple(sorted(candidates, key=lambda candidate: candidate[0].area))
+            for key, candidates in cells.items()
+        }
+
+    def _cell(self, degrees: float) -> int:
+        return math.floor(degrees / self.cell_degrees)
+
+    def lookup(self, lat: float, lon: float):
+        candidates = self.cells.get((self._cell(lat), self._cell(lon)))
+        if candidates:
+            for polygon, value in candidates:
+                if polygon.contains(lat, lon):
+                    return value
+        return None
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+
+def point_or_none(lat: Optional[float], lon: Optional[float]) -> Optional[tuple[float, float]]:
+    """Point (lat, lon) si les deux coordonnées sont connues"""
+    if lat is None or lon is None:
+        return None
+    return lat, lon
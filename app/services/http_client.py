@@ -0,0 +1,114 @@
+import asyncio
+import os
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+except ImportError:  # HTTP/1.1 seulement
+    h2 = None
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+# Connexions inactives gardées ouvertes pour être réutilisées
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", 30))
+# Requêtes simultanées vers un même hôte (un partenaire lent ne monopolise pas le pool)
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", 20))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", 5))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", 10))
+# HTTP/2 est négocié (ALPN) avec les serveurs qui le proposent, si h2 est installé
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "true").lower() == "true" and h2 is not None
+
+
+def build_client(**options) -> httpx.AsyncClient:
+    """Client httpx avec la configuration de l'application ; `options` la remplace"""
+    settings = {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        "http2": HTTP2_ENABLED,
+    }
+    settings.update(options)
+    return httpx.AsyncClient(**settings)
+
+
+class HttpClientPool:
+    """Client HTTP sortant partagé par l'application (webhooks, e-mails)
+
+    Ouvert et fermé par le lifespan : les connexions (et leur poignée de
+    main TLS) sont réutilisées d'un appel à l'autre au lieu d'être recréées
+    à chaque message. Le nombre de requêtes simultanées par hôte est borné.
+    Un appel depuis une autre boucle (ou avant open()) passe par un client
+    éphémère.
+    """
+
+    def __init__(self, max_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST):
+        self.max_per_host = max_per_host
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.errors = 0
+        self.waiting = 0
+
+    def open(self):
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is loop:
+            return
+        self._client = build_client()
+        self._loop = loop
+        self._hosts = {}
+
+    async def close(self):
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            await client.aclose()
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self._client is None or self._loop is not asyncio.get_running_loop():
+            # Hors du lifespan (scripts, tests) : client éphémère, fermé avant de rendre la main
+            # (un client laissé ouvert sur une boucle terminée ne peut plus être fermé)
+            async with build_client() as client:
+                return await self._send(client, method, url, **kwargs)
+        host = urlsplit(url).netloc
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        self.waiting += 1
+        try:
+            await slot.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await self._send(self._client, method, url, **kwargs)
+        finally:
+            slot.release()
+
+    async def _send(self, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+        try:
+            self.requests += 1
+            return await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "open": self._client is not None,
+            "http2": HTTP2_ENABLED,
+            "hosts": len(self._hosts),
+            "requests": self.requests,
+            "errors": self.errors,
+            "waiting": self.waiting,
+        }
+
+
+http_client = HttpClientPool()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from app.database.database import SessionLocal
+from app.models.location import CourierPosition
+from app.services.courier_index import courier_index
+
+# Positions gardées par livreur entre deux écritures ; au-delà, les plus anciennes sont écrasées
+LOCATION_BUFFER_SIZE = int(os.environ.get("LOCATION_BUFFER_SIZE", 120))
+LOCATION_FLUSH_INTERVAL_SECONDS = float(os.environ.get("LOCATION_FLUSH_INTERVAL_SECONDS", 5))
+# Lignes conservées pour une nouvelle tentative si l'écriture échoue
+LOCATION_MAX_PENDING_ROWS = int(os.environ.get("LOCATION_MAX_PENDING_ROWS", 100_000))
+
+
+class LocationIngestor:
+    """Tampon en mémoire des positions GPS, vidé en base par INSERT multi-lignes
+
+    Chaque livreur a son anneau borné : un livreur qui envoie trop vite ne
+    peut pas faire grossir la mémoire, et un vidage écrit les positions de
+    tous les livreurs en une seule transaction.
+    """
+
+    def __init__(self, session_factory=SessionLocal, buffer_size: int = LOCATION_BUFFER_SIZE, position_index=courier_index):
+        self.session_factory = session_factory
+        self.position_index = position_index
+        self.buffer_size = buffer_size
+        self.received = 0
+        self.overwritten = 0
+        self.written = 0
+        self.flush_errors = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffers: dict[int, deque] = {}
+        self._pending: list[dict] = []
+
+    def add(self, livreur_id: int, pings) -> int:
+        """Ajouter des positions (objets avec lat, lon, recorded_at) au tampon du livreur"""
+        now = datetime.now(timezone.utc)
+        rows = []
+        for ping in pings:
+            recorded_at = ping.recorded_at or now
+            if recorded_at.tzinfo is None:
+                recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+            rows.append({"livreur_id": livreur_id, "lat": ping.lat, "lon": ping.lon, "recorded_at": recorded_at})
+        if not rows:
+            return 0
+        if self.position_index is not None:
+            latest = max(rows, key=lambda row: row["recorded_at"])
+            self.position_index.update(livreur_id, latest["lat"], latest["lon"], latest["recorded_at"])
+        with self._lock:
+            buffer = self._buffers.get(livreur_id)
+            if buffer is None:
+                buffer = self._buffers[livreur_id] = deque(maxlen=self.buffer_size)
+            self.overwritten += max(len(buffer) + len(rows) - self.buffer_size, 0)
+            buffer.extend(rows)
+            self.received += len(rows)
+        return len(rows)
+
+    def _drain(self) -> list[dict]:
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+        return [row for buffer in buffers.values() for row in buffer]
+
+    def flush(self) -> int:
+        """Écrire toutes les positions en attente ; retourne le nombre de lignes écrites"""
+        with self._flush_lock:
+            rows = self._pending + self._drain()
+            self._pending = []
+            if not rows:
+                return 0
+            db = self.session_factory()
+            try:
+                db.execute(insert(CourierPosition), rows)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.flush_errors += 1
+                # Les plus récentes sont gardées pour la prochaine tentative
+                self._pending = rows[-LOCATION_MAX_PENDING_ROWS:]
+                raise
+            finally:
+                db.close()
+            self.written += len(rows)
+            return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = sum(len(buffer) for buffer in self._buffers.values())
+        return {
+            "received": self.received,
+            "written": self.written,
+            "buffered": buffered + len(self._pending),
+            "overwritten": self.overwritten,
+            "flush_errors": self.flush_errors,
+        }
+
+    async def run_forever(self, interval: float = LOCATION_FLUSH_INTERVAL_SECONDS):
+        """Vidage périodique ; un dernier vidage a lieu à l'arrêt"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self._flush_in_thread()
+        finally:
+            await self._flush_in_thread()
+
+    async def _flush_in_thread(self):
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            print(f"Location flush error: {e}")
+
+
+location_ingestor = LocationIngestor()
@@ -0,0 +1,30 @@
+from app.routes.websockets import manager as websocket_manager
+from app.services.email_services import email_service
+from app.services.event_bus import EventBus, DeliveryNotification, UserRegistered
+from app.services.pubsub import broker, WEBSOCKET_CHANNEL
+from app.services.delivery_waiters import delivery_waiters
+from app.services.webhook_outbox import webhook_dispatcher
+
+
+def publish_to_websockets(event: DeliveryNotification):
+    # Remis à chaque worker, qui l'envoie à ses propres connexions
+    broker.publish(WEBSOCKET_CHANNEL, {"message": event.message, "topics": event.topics})
+
+
+def deliver_to_local_websockets(data: dict):
+    websocket_manager.publish(data["message"], data["topics"])
+
+
+async def send_welcome_email(event: UserRegistered):
+    await email_service.send_welcome_email(email=event.email, nom=event.nom, telephone=event.telephone)
+
+
+def register_notification_handlers(bus: EventBus):
+    """Brancher les sorties (WebSocket, webhooks, e-mail) sur le bus d'événements"""
+    broker.subscribe(WEBSOCKET_CHANNEL, deliver_to_local_websockets)
+    # Long-poll et SSE de /deliveries/{id}/status|events
+    broker.subscribe(WEBSOCKET_CHANNEL, delivery_waiters.wake_for_message)
+    bus.subscribe(DeliveryNotification, publish_to_websockets)
+    # Les webhooks sont déjà dans webhook_outbox (même commit) : on réveille seulement les workers
+    bus.subscribe(DeliveryNotification, webhook_dispatcher.wake)
+    bus.subscribe(UserRegistered, send_welcome_email)
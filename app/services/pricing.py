@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+from app.database.database import SessionLocal
+from app.models.zone import DeliveryZone
+from app.services.geo import Polygon, PolygonGrid
+
+# Durée de vie de l'index : borne le délai de propagation d'une modification
+# de zone faite par un autre worker
+ZONE_INDEX_TTL_SECONDS = float(os.environ.get("ZONE_INDEX_TTL_SECONDS", 60))
+DEFAULT_DELIVERY_PRICE = int(os.environ.get("DEFAULT_DELIVERY_PRICE", 0))  # centimes
+
+
+def normalize(text: str) -> str:
+    """Minuscules sans accents, pour comparer adresses et noms de zones"""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in text if not unicodedata.combining(char)).lower().strip()
+
+
+class ZoneEntry:
+    __slots__ = ("id", "nom_zone", "prix")
+
+    def __init__(self, id: int, nom_zone: str, prix: float):
+        self.id = id
+        self.nom_zone = nom_zone
+        self.prix = prix
+
+
+class ZoneIndex:
+    """Index en mémoire des zones de livraison actives
+
+    Chargé en une requête puis servi sans accès base jusqu'à invalidation
+    (écriture sur une zone) ou expiration du TTL.
+    """
+
+    def __init__(self, session_factory=SessionLocal, ttl: float = ZONE_INDEX_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.Lock()
+        # (chargé le, zones, mot-clé -> zone, motif de recherche, grille des polygones)
+        self._state = None
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+            self.version += 1
+
+    def _load(self):
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(
+                    DeliveryZone.id, DeliveryZone.nom_zone, DeliveryZone.area,
+                    DeliveryZone.polygon, DeliveryZone.prix,
+                )
+                .filter(DeliveryZone.is_active == True)
+                .order_by(DeliveryZone.id)
+                .all()
+            )
+        finally:
+            db.close()
+
+        zones = []
+        keywords = {}
+        polygons = []
+        for row in rows:
+            zone = ZoneEntry(row.id, row.nom_zone, row.prix)
+            zones.append(zone)
+            if row.polygon:
+                try:
+                    polygons.append((zone, Polygon(row.polygon)))
+                except (TypeError, ValueError) as e:
+                    print(f"Polygone ignoré pour la zone {row.id}: {e}")
+            # Le nom de la zone et chaque quartier listé dans `area` servent de mots-clés
+            for keyword in [row.nom_zone, *re.split(r"[,;/\n]", row.area or "")]:
+                keyword = normalize(keyword)
+                if keyword and keyword not in keywords:
+                    keywords[keyword] = zone
+        pattern = None
+        if keywords:
+            alternatives = sorted(keywords, key=len, reverse=True)
+            pattern = re.compile(r"\b(" + "|".join(re.escape(k) for k in alternatives) + r")\b")
+        return time.monotonic(), zones, keywords, pattern, PolygonGrid(polygons)
+
+    def _current(self):
+        state = self._state
+        if state is None or time.monotonic() - state[0] > self.ttl:
+            with self._lock:
+                state = self._state
+                if state is None or time.monotonic() - state[0] > self.ttl:
+                    state = self._state = self._load()
+        return state
+
+    def zones(self) -> list[ZoneEntry]:
+        return self._current()[1]
+
+    def match_address(self, adresse: str) -> Optional[ZoneEntry]:
+        """Zone dont le nom (ou un quartier) apparaît dans l'adresse ; le plus long l'emporte"""
+        _, _, keywords, pattern, _ = self._current()
+        if pattern is None:
+            return None
+        matches = pattern.findall(normalize(adresse))
+        if not matches:
+            return None
+        return keywords[max(matches, key=len)]
+
+    def resolve(self, lat: float, lon: float) -> Optional[ZoneEntry]:
+        """Zone dont le polygone contient le point (la plus petite si elles se chevauchent)"""
+        return self._current()[4].lookup(lat, lon)
+
+    def locate(self, adresse: str, point: Optional[tuple[float, float]] = None) -> Optional[ZoneEntry]:
+        """Zone d'un point si les coordonnées sont connues, sinon d'après l'adresse"""
+        if point is not None:
+            zone = self.resolve(*point)
+            if zone is not None:
+                return zone
+        return self.match_address(adresse)
+
+
+class PricingEngine:
+    """Calcul du prix d'une course à partir des zones de départ et d'arrivée"""
+
+    def __init__(self, zone_index: ZoneIndex, default_price: int = DEFAULT_DELIVERY_PRICE):
+        self.zone_index = zone_index
+        self.default_price = default_price
+
+    def quote(
+        self,
+        adresse_pickup: str,
+        adresse_dropoff: str,
+        pickup_point: Optional[tuple[float, float]] = None,
+        dropoff_point: Optional[tuple[float, float]] = None,
+    ) -> int:
+        """Prix en centimes : tarif de la zone la plus chère traversée
+
+        Le prix d'une zone est exprimé en unités monétaires, celui d'une
+        livraison en centimes.
+        """
+        zones = [
+            self.zone_index.locate(adresse_pickup, pickup_point),
+            self.zone_index.locate(adresse_dropoff, dropoff_point),
+        ]
+        prices = [zone.prix for zone in zones if zone is not None]
+        if not prices:
+            return self.default_price
+        return int(round(max(prices) * 100))
+
+
+zone_index = ZoneIndex()
+pricing_engine = PricingEngine(zone_index)
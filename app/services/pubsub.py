@@ -0,0 +1,266 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from app.database.database import DATABASE_URL, engine
+
+# memory : un seul processus (tests, développement) ; postgres : LISTEN/NOTIFY entre workers
+PUBSUB_BACKEND = os.environ.get(
+    "PUBSUB_BACKEND", "postgres" if DATABASE_URL.startswith("postgres") else "memory"
+)
+PUBSUB_PG_CHANNEL = os.environ.get("PUBSUB_PG_CHANNEL", "riganova_events")
+PUBSUB_RECONNECT_SECONDS = float(os.environ.get("PUBSUB_RECONNECT_SECONDS", 1))
+# Messages envoyés par transaction NOTIFY
+PUBSUB_BATCH_SIZE = int(os.environ.get("PUBSUB_BATCH_SIZE", 500))
+# Durée de conservation des messages trop gros pour NOTIFY
+PUBSUB_PAYLOAD_TTL_SECONDS = float(os.environ.get("PUBSUB_PAYLOAD_TTL_SECONDS", 300))
+
+# Limite de PostgreSQL : 8000 octets par notification
+NOTIFY_MAX_PAYLOAD = 7900
+
+WEBSOCKET_CHANNEL = "websocket"
+ZONES_CHANNEL = "zones"
+
+
+class MemoryBroker:
+    """Pub/sub dans le processus : chaque message est remis immédiatement aux abonnés locaux"""
+
+    def __init__(self):
+        self.handlers: dict[str, list[Callable]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.errors = 0
+
+    def subscribe(self, channel: str, handler: Callable):
+        """handler(data) est appelé une fois par message, sur chaque nœud ; il ne doit pas bloquer"""
+        handlers = self.handlers.setdefault(channel, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def publish(self, channel: str, data: dict):
+        self.published += 1
+        self._deliver(channel, data)
+
+    def _deliver(self, channel: str, data: dict):
+        self.delivered += 1
+        for handler in self.handlers.get(channel, ()):
+            try:
+                handler(data)
+            except Exception as e:
+                self.errors += 1
+                print(f"Pub/sub handler error ({channel}): {e}")
+
+    async def run_forever(self):
+        return
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "published": self.published,
+            "delivered": self.delivered,
+            "errors": self.errors,
+        }
+
+
+class PostgresBroker(MemoryBroker):
+    """Pub/sub entre processus par LISTEN/NOTIFY sur la base existante
+
+    Chaque processus garde une connexion dédiée en écoute sur un canal
+    PostgreSQL ; un message publié est remis une fois à chaque processus, y
+    compris celui qui l'a publié (jamais directement en local, sinon il
+    arriverait deux fois).
+
+    publish() ne bloque pas : les messages sont envoyés par lots, dans une
+    transaction par lot et dans l'ordre de publication. Un message dépassant
+    la limite de NOTIFY est stocké dans pubsub_payloads et seul son
+    identifiant est notifié.
+
+    Pendant une reconnexion de l'écoute, les messages émis sont perdus pour
+    ce processus : le temps réel reste au mieux, l'état fait foi en base.
+    """
+
+    def __init__(self, engine=engine, channel: str = PUBSUB_PG_CHANNEL):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self.node = uuid.uuid4().hex[:12]
+        self._sequence = itertools.count()
+        self._outbox = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_cleanup = 0.0
+        self.listening = False
+        self.reconnects = 0
+        self.overflowed = 0
+
+    def publish(self, channel: str, data: dict):
+        loop = self.loop
+        if loop is None:
+            # Écoute non démarrée (script, application sans lifespan) : remise locale
+            super().publish(channel, data)
+            return
+        self.published += 1
+        # Numéro de séquence : PostgreSQL fusionne les notifications identiques d'une transaction
+        self._outbox.append(json.dumps(
+            {"c": channel, "d": data, "n": self.node, "s": next(self._sequence)},
+            separators=(",", ":"), ensure_ascii=False, default=str,
+        ))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wakeup.set()
+        else:
+            try:
+                loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass
+
+    async def run_forever(self):
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            await asyncio.gather(self._send_forever(), self._listen_forever())
+        finally:
+            self.loop = None
+
+    async def _send_forever(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._outbox:
+                batch = [self._outbox.popleft() for _ in range(min(len(self._outbox), PUBSUB_BATCH_SIZE))]
+                try:
+                    await asyncio.to_thread(self._notify, batch)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Pub/sub publish error ({len(batch)} messages lost): {e}")
+
+    def _notify(self, batch: list[str]):
+        with self.engine.begin() as conn:
+            payloads = []
+            for message in batch:
+                if len(message.encode()) > NOTIFY_MAX_PAYLOAD:
+                    payload_id = conn.execute(
+                        text("INSERT INTO pubsub_payloads (payload) VALUES (:payload) RETURNING id"),
+                        {"payload": message},
+                    ).scalar()
+                    message = f"@{payload_id}"
+                    self.overflowed += 1
+                payloads.append(message)
+            # Notifications remises à la validation, dans l'ordre du tableau
+            conn.execute(
+                text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                {"channel": self.channel, "payloads": payloads},
+            )
+            if time.monotonic() - self._last_cleanup > PUBSUB_PAYLOAD_TTL_SECONDS:
+                conn.execute(
+                    text("DELETE FROM pubsub_payloads WHERE created_at < now() - make_interval(secs => :ttl)"),
+                    {"ttl": PUBSUB_PAYLOAD_TTL_SECONDS},
+                )
+                self._last_cleanup = time.monotonic()
+
+    def _connect(self):
+        import psycopg2
+
+        connection = psycopg2.connect(
+            self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False),
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+        )
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    def _fetch_payload(self, payload_id: int) -> Optional[str]:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT payload FROM pubsub_payloads WHERE id = :id"), {"id": payload_id}
+            ).scalar()
+
+    async def _listen_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                connection = await asyncio.to_thread(self._connect)
+            except Exception as e:
+                print(f"Pub/sub listen error: {e}")
+                await asyncio.sleep(PUBSUB_RECONNECT_SECONDS)
+                continue
+            received: asyncio.Queue = asyncio.Queue()
+
+            def on_readable():
+                try:
+                    connection.poll()
+                except Exception as e:
+                    loop.remove_reader(connection.fileno())
+                    received.put_nowait(e)
+                    return
+                while connection.notifies:
+                    received.put_nowait(connection.notifies.pop(0).payload)
+
+            loop.add_reader(connection.fileno(), on_readable)
+            self.listening = True
+            try:
+                while True:
+                    payload = await received.get()
+                    if isinstance(payload, Exception):
+                        raise payload
+                    await self._receive(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reconnects += 1
+                print(f"Pub/sub connection lost: {e}")
+            finally:
+                self.listening = False
+                try:
+                    loop.remove_reader(connection.fileno())
+                except Exception:
+                    pass
+                connection.close()
+            await asyncio.sleep(PUBSUB_RECONNECT_SECONDS)
+
+    async def _receive(self, payload: str):
+        try:
+            if payload.startswith("@"):
+                payload = await asyncio.to_thread(self._fetch_payload, int(payload[1:]))
+                if payload is None:
+                    return
+            message = json.loads(payload)
+        except Exception as e:
+            self.errors += 1
+            print(f"Pub/sub invalid message: {e}")
+            return
+        self._deliver(message["c"], message["d"])
+
+    def stats(self) -> dict:
+        return {
+            "backend": "postgres",
+            "node": self.node,
+            "listening": self.listening,
+            "published": self.published,
+            "delivered": self.delivered,
+            "pending": len(self._outbox),
+            "overflowed": self.overflowed,
+            "reconnects": self.reconnects,
+            "errors": self.errors,
+        }
+
+
+def create_broker(backend: str = PUBSUB_BACKEND):
+    if backend == "postgres":
+        return PostgresBroker()
+    if backend == "memory":
+        return MemoryBroker()
+    raise ValueError(f"PUBSUB_BACKEND inconnu : {backend}")
+
+broker = create_broker()
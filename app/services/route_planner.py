@@ -0,0 +1,229 @@
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.models import DeliveryStatus
+from app.services.geo import EARTH_RADIUS_KM
+
+# Budget de calcul d'une tournée ; la recherche locale s'arrête à son échéance
+ROUTE_PLANNER_TIME_BUDGET_MS = float(os.environ.get("ROUTE_PLANNER_TIME_BUDGET_MS", 50))
+# Départs supplémentaires (plus proche voisin randomisé) tant que le budget le permet
+ROUTE_PLANNER_RESTARTS = int(os.environ.get("ROUTE_PLANNER_RESTARTS", 8))
+
+PICKUP = "pickup"
+DROPOFF = "dropoff"
+
+# Colis déjà récupéré : seul le dropoff reste à faire
+PICKED_UP_STATUSES = {DeliveryStatus.COLIS_RECUPERE, DeliveryStatus.EN_ROUTE_LIVRAISON}
+
+
+class RouteStop:
+    __slots__ = ("delivery_id", "kind", "lat", "lon", "adresse")
+
+    def __init__(self, delivery_id: int, kind: str, lat: float, lon: float, adresse: Optional[str] = None):
+        self.delivery_id = delivery_id
+        self.kind = kind
+        self.lat = lat
+        self.lon = lon
+        self.adresse = adresse
+
+
+def stops_for_deliveries(deliveries) -> tuple[list[RouteStop], list[int]]:
+    """Arrêts restants des livraisons en cours, et livraisons sans coordonnées utilisables"""
+    stops = []
+    unplaced = []
+    for delivery in deliveries:
+        needs_pickup = delivery.statut not in PICKED_UP_STATUSES
+        if delivery.dropoff_lat is None or delivery.dropoff_lon is None or (
+            needs_pickup and (delivery.pickup_lat is None or delivery.pickup_lon is None)
+        ):
+            unplaced.append(delivery.id)
+            continue
+        if needs_pickup:
+            stops.append(RouteStop(delivery.id, PICKUP, delivery.pickup_lat, delivery.pickup_lon, delivery.adresse_pickup))
+        stops.append(RouteStop(delivery.id, DROPOFF, delivery.dropoff_lat, delivery.dropoff_lon, delivery.adresse_dropoff))
+    return stops, unplaced
+
+
+def distance_matrix(lats, lons) -> np.ndarray:
+    """Distances haversine (km) entre tous les points, calculées en une passe NumPy"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    dlat = lat[:, np.newaxis] - lat[np.newaxis, :]
+    dlon = lon[:, np.newaxis] - lon[np.newaxis, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, np.newaxis] * np.cos(lat)[np.newaxis, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class RoutePlanner:
+    """Ordre de passage pickup/dropoff d'un livreur
+
+    Plus proche voisin, puis recherche locale (2-opt et déplacement d'un
+    arrêt) jusqu'à ce qu'aucun mouvement n'améliore ou que le budget expire.
+    Le budget restant sert à relancer depuis des plus proches voisins
+    randomisés ; la meilleure tournée est gardée.
+
+    Le trajet est ouvert : il part de la position du livreur (ou de n'importe
+    quel arrêt si elle est inconnue) et se termine au dernier dropoff. Le
+    dropoff d'une livraison vient toujours après son pickup.
+    """
+
+    def __init__(self, time_budget_ms: float = ROUTE_PLANNER_TIME_BUDGET_MS, restarts: int = ROUTE_PLANNER_RESTARTS):
+        self.time_budget_ms = time_budget_ms
+        self.restarts = restarts
+
+    def plan(self, stops: list[RouteStop], origin: Optional[tuple[float, float]] = None) -> tuple[list[RouteStop], np.ndarray]:
+        """Arrêts ordonnés et longueur de chaque étape (km)"""
+        if not stops:
+            return [], np.zeros(0)
+        deadline = time.perf_counter() + self.time_budget_ms / 1000
+
+        # Nœud 0 : point de départ. Sans position connue, il est à distance nulle de tout.
+        n = len(stops) + 1
+        if origin is not None:
+            dist = distance_matrix([origin[0]] + [s.lat for s in stops], [origin[1]] + [s.lon for s in stops])
+        else:
+            dist = np.zeros((n, n))
+            dist[1:, 1:] = distance_matrix([s.lat for s in stops], [s.lon for s in stops])
+
+        # partner[i] : nœud pickup d'un dropoff (et inversement), -1 si l'autre moitié est déjà faite
+        partner = np.full(n, -1, dtype=np.int64)
+        pickups = {}
+        for node, stop in enumerate(stops, start=1):
+            if stop.kind == PICKUP:
+                pickups[stop.delivery_id] = node
+        for node, stop in enumerate(stops, start=1):
+            if stop.kind == DROPOFF and stop.delivery_id in pickups:
+                partner[node] = pickups[stop.delivery_id]
+                partner[pickups[stop.delivery_id]] = node
+        is_pickup = np.array([False] + [s.kind == PICKUP for s in stops])
+
+        route = self._improve(self._nearest_neighbour(dist, partner, is_pickup), dist, partner, is_pickup, deadline)
+        length = dist[route[:-1], route[1:]].sum()
+        # Graine fixe : une même entrée donne la même tournée
+        rng = np.random.default_rng(0)
+        for _ in range(self.restarts):
+            if time.perf_counter() >= deadline:
+                break
+            candidate = self._nearest_neighbour(dist, partner, is_pickup, rng)
+            candidate = self._improve(candidate, dist, partner, is_pickup, deadline)
+            candidate_length = dist[candidate[:-1], candidate[1:]].sum()
+            if candidate_length < length - 1e-9:
+                route, length = candidate, candidate_length
+        legs = dist[route[:-1], route[1:]]
+        return [stops[node - 1] for node in route[1:]], legs
+
+    @staticmethod
+    def _nearest_neighbour(dist: np.ndarray, partner: np.ndarray, is_pickup: np.ndarray, rng=None) -> np.ndarray:
+        """Plus proche voisin ; avec rng, choix au hasard parmi les deux plus proches"""
+        n = len(dist)
+        visited = np.zeros(n, dtype=bool)
+        visited[0] = True
+        # Un dropoff n'est disponible qu'une fois son pickup visité
+        available = ~visited & ((partner < 0) | is_pickup)
+        route = [0]
+        current = 0
+        for _ in range(n - 1):
+            candidates = np.where(available, dist[current], np.inf)
+            if rng is not None and available.sum() > 1 and rng.random() < 0.5:
+                current = int(np.argpartition(candidates, 1)[1])
+            else:
+                current = int(np.argmin(candidates))
+            route.append(current)
+            visited[current] = True
+            available[current] = False
+            if is_pickup[current] and partner[current] >= 0:
+                available[partner[current]] = True
+        return np.array(route, dtype=np.int64)
+
+    @staticmethod
+    def _segment_limits(route: np.ndarray, partner: np.ndarray, is_pickup: np.ndarray) -> np.ndarray:
+        """limit[i] : dernière position j telle que route[i..j] ne contient aucun couple pickup/dropoff
+
+        Inverser un tel segment ne peut pas placer un dropoff avant son pickup.
+        """
+        n = len(route)
+        position = np.empty(n, dtype=np.int64)
+        position[route] = np.arange(n)
+        limit_at = np.full(n + 1, n - 1, dtype=np.int64)
+        nodes = route[is_pickup[route] & (partner[route] >= 0)]
+        limit_at[position[nodes]] = position[partner[nodes]] - 1
+        # Minimum sur les pickups situés à la position i ou après
+        return np.minimum.accumulate(limit_at[::-1])[::-1][:n]
+
+    def _improve(self, route, dist, partner, is_pickup, deadline) -> np.ndarray:
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = self._two_opt_pass(route, dist, partner, is_pickup, deadline)
+            if time.perf_counter() < deadline:
+                route, relocated = self._relocate_pass(route, dist, partner, deadline)
+                improved = improved or relocated
+        return route
+
+    def _two_opt_pass(self, route, dist, partner, is_pickup, deadline) -> bool:
+        """Inversions de segments améliorantes, appliquées sur place"""
+        n = len(route)
+        improved = False
+        limits = self._segment_limits(route, partner, is_pickup)
+        for i in range(1, n - 1):
+            last = limits[i]
+            if last <= i:
+                continue
+            a, b = route[i - 1], route[i]
+            js = np.arange(i + 1, last + 1)
+            c = route[js]
+            # Gain de l'inversion de route[i..j] ; pas d'arête sortante après le dernier arrêt
+            has_next = js + 1 < n
+            after = route[np.minimum(js + 1, n - 1)]
+            delta = dist[a, c] - dist[a, b] + np.where(has_next, dist[b, after] - dist[c, after], 0.0)
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = int(js[best])
+                route[i:j + 1] = route[i:j + 1][::-1].copy()
+                improved = True
+                limits = self._segment_limits(route, partner, is_pickup)
+            if time.perf_counter() >= deadline:
+                break
+        return improved
+
+    @staticmethod
+    def _relocate_pass(route, dist, partner, deadline) -> tuple[np.ndarray, bool]:
+        """Déplacer un arrêt ailleurs dans la tournée, sans passer de l'autre côté de son couple"""
+        improved = False
+        i = 1
+        while i < len(route) and time.perf_counter() < deadline:
+            n = len(route)
+            node = route[i]
+            prev = route[i - 1]
+            if i + 1 < n:
+                removal_gain = dist[prev, node] + dist[node, route[i + 1]] - dist[prev, route[i + 1]]
+            else:
+                removal_gain = dist[prev, node]
+            rest = np.delete(route, i)
+            # Insertion avant rest[k] (k = len(rest) : en fin de tournée)
+            ks = np.arange(1, len(rest) + 1)
+            before = rest[ks - 1]
+            at_end = ks == len(rest)
+            following = rest[np.minimum(ks, len(rest) - 1)]
+            insert_cost = dist[before, node] + np.where(
+                at_end, 0.0, dist[node, following] - dist[before, following]
+            )
+            feasible = np.ones(len(ks), dtype=bool)
+            if partner[node] >= 0:
+                partner_position = int(np.flatnonzero(rest == partner[node])[0])
+                if partner_position < i:
+                    feasible = ks > partner_position   # dropoff : après son pickup
+                else:
+                    feasible = ks <= partner_position  # pickup : avant son dropoff
+            delta = np.where(feasible, insert_cost - removal_gain, np.inf)
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                k = int(ks[best])
+                route = np.insert(rest, k, node)
+                improved = True
+            i += 1
+        return route, improved
+
+route_planner = RoutePlanner()
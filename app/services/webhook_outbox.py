@@ -0,0 +1,394 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models.webhook import WEBHOOK_PENDING, WEBHOOK_DELIVERED, WEBHOOK_DEAD
+from app.services.http_client import http_client
+
+# Tâches d'envoi par processus
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 4))
+# Webhooks réservés par une tâche à chaque passage
+WEBHOOK_CLAIM_BATCH = int(os.environ.get("WEBHOOK_CLAIM_BATCH", 20))
+WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get("WEBHOOK_TIMEOUT_SECONDS", 10))
+# Un webhook réservé par un processus arrêté en plein envoi redevient disponible après ce délai
+WEBHOOK_LEASE_SECONDS = int(os.environ.get("WEBHOOK_LEASE_SECONDS", 60))
+# Au-delà, le webhook passe en lettre morte (relance manuelle via l'API)
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", 10))
+WEBHOOK_BACKOFF_BASE_SECONDS = float(os.environ.get("WEBHOOK_BACKOFF_BASE_SECONDS", 5))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.environ.get("WEBHOOK_BACKOFF_MAX_SECONDS", 3600))
+# Attente maximale entre deux scrutations quand aucun événement local ne réveille les tâches
+WEBHOOK_POLL_SECONDS = float(os.environ.get("WEBHOOK_POLL_SECONDS", 2))
+# Durée de conservation des webhooks livrés (et de leurs tentatives)
+WEBHOOK_RETENTION_DAYS = int(os.environ.get("WEBHOOK_RETENTION_DAYS", 7))
+WEBHOOK_CLEANUP_INTERVAL_SECONDS = 3600
+# Taille maximale de l'erreur enregistrée par tentative
+MAX_ERROR_LENGTH = 500
+# Bornes des réglages de regroupement acceptés par abonnement
+WEBHOOK_MAX_BATCH_SIZE = int(os.environ.get("WEBHOOK_MAX_BATCH_SIZE", 500))
+WEBHOOK_MAX_LINGER_MS = int(os.environ.get("WEBHOOK_MAX_LINGER_MS", 60000))
+# Lignes réservées au plus par passage, lots compris
+WEBHOOK_CLAIM_MAX_ROWS = 2000
+
+
+def webhook_payload(event: dict, event_id: int, created_at) -> dict:
+    """Corps du webhook d'un événement du journal (voir event_log.delivery_event)"""
+    data = {
+        "delivery_id": event["delivery_id"],
+        "client_id": event["client_id"],
+        "livreur_id": event["livreur_id"],
+        "status": event["statut"].value if event["statut"] is not None else None,
+    }
+    data.update(event["payload"] or {})
+    return {
+        "id": event_id,
+        "event": event["event_type"],
+        "timestamp": created_at.isoformat(),
+        "data": data,
+    }
+
+
+def enqueue_webhooks(db: Session, payloads: list[dict]):
+    """Ajouter dans la transaction courante un webhook par événement et par abonné
+
+    Un seul INSERT ... SELECT : les abonnements sont lus par la base, dans le
+    même commit que la modification de la livraison. Un événement sans abonné
+    n'écrit rien. Pour un abonnement groupé, l'échéance est repoussée de
+    batch_linger_ms afin que les événements suivants rejoignent le même lot.
+    """
+    if payloads:
+        db.execute(
+            text("""
+                INSERT INTO webhook_outbox (subscription_id, event_type, payload, next_attempt_at)
+                SELECT s.id, e.payload->>'event', e.payload,
+                       now() + make_interval(secs => s.batch_linger_ms / 1000.0)
+                FROM jsonb_array_elements(CAST(:payloads AS jsonb)) AS e(payload)
+                JOIN webhook_subscriptions s ON e.payload->>'event' = ANY(s.events)
+            """),
+            {"payloads": json.dumps(payloads)},
+        )
+
+
+def webhook_signature(secret: str, timestamp: str, body: bytes) -> str:
+    """Valeur de X-Webhook-Signature : HMAC-SHA256 de "<X-Webhook-Timestamp>.<corps brut>"
+
+    Le partenaire recalcule la signature avec le secret de son abonnement et
+    rejette les horodatages trop anciens (rejeu).
+    """
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Délai avant la tentative suivante : exponentiel, plafonné, avec gigue"""
+    delay = min(WEBHOOK_BACKOFF_MAX_SECONDS, WEBHOOK_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class WebhookDispatcher:
+    """Pool de tâches qui vident la table webhook_outbox
+
+    Chaque tâche réserve un lot de webhooks dus (FOR UPDATE SKIP LOCKED : les
+    workers de tous les processus se partagent la table sans se bloquer), en
+    repoussant leur échéance de WEBHOOK_LEASE_SECONDS, les envoie en parallèle
+    puis enregistre toutes les tentatives en une transaction. Un échec est
+    reprogrammé avec un délai exponentiel ; après WEBHOOK_MAX_ATTEMPTS, le
+    webhook passe en lettre morte. Si le processus s'arrête en plein envoi,
+    la réservation expire et un autre worker reprend le webhook : un
+    partenaire peut donc recevoir un même webhook deux fois (champ "id").
+
+    Un abonnement avec batch_size > 1 reçoit un tableau JSON de webhooks par
+    POST. Ses webhooks neufs attendent au plus batch_linger_ms (échéance
+    repoussée à l'écriture) ; ils partent ensemble dès que l'un d'eux est dû
+    ou que batch_size webhooks sont en attente. Un lot est réessayé comme un
+    tout : même délai pour toutes ses lignes, qui restent donc groupées.
+
+    Chaque POST est signé (voir webhook_signature) avec le secret de
+    l'abonnement.
+
+    Les tâches sont réveillées dès qu'une livraison change dans ce processus,
+    et dorment sinon jusqu'à la prochaine échéance (au plus
+    WEBHOOK_POLL_SECONDS).
+    """
+
+    def __init__(self, session_factory=SessionLocal, workers: int = WEBHOOK_WORKERS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self._wakeup: Optional[asyncio.Event] = None
+        self.delivered = 0
+        self.requests = 0
+        self.failed = 0
+        self.dead = 0
+        self.inflight = 0
+        self.errors = 0
+
+    def wake(self, event=None):
+        """Abonné au bus d'événements : un changement de livraison a pu écrire des webhooks"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def claim(self, limit: int = WEBHOOK_CLAIM_BATCH) -> tuple[list, Optional[float]]:
+        """Réserver les webhooks dus et les lots prêts
+
+        Retourne les lignes réservées, ou, s'il n'y en a aucune, le nombre de
+        secondes avant la prochaine échéance (None si la table est vide).
+        """
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                text("""
+                    WITH due AS (
+                        SELECT id, subscription_id FROM webhook_outbox
+                        WHERE status = :pending AND next_attempt_at <= now()
+                        ORDER BY next_attempt_at
+                        LIMIT :limit
+                    ), full_batches AS (
+                        SELECT o.subscription_id
+                        FROM webhook_outbox o
+                        JOIN webhook_subscriptions s ON s.id = o.subscription_id
+                        WHERE o.status = :pending AND o.attempts = 0 AND s.batch_size > 1
+                        GROUP BY o.subscription_id, s.batch_size
+                        HAVING count(*) >= s.batch_size
+                    ), claimed AS (
+                        SELECT o.id
+                        FROM webhook_outbox o
+                        JOIN webhook_subscriptions s ON s.id = o.subscription_id
+                        -- Conditions revérifiées sur la ligne verrouillée : une ligne
+                        -- réservée entre-temps par un autre worker n'est plus ni due ni neuve
+                        WHERE o.status = :pending AND (o.attempts = 0 OR o.next_attempt_at <= now()) AND (
+                            o.id IN (SELECT id FROM due)
+                            -- abonnement groupé : ses webhooks dus et neufs rejoignent le lot
+                            OR (s.batch_size > 1 AND (
+                                o.subscription_id IN (SELECT subscription_id FROM due)
+                                OR o.subscription_id IN (SELECT subscription_id FROM full_batches)
+                            ))
+                        )
+                        ORDER BY o.id
+                        LIMIT :max_rows
+                        FOR UPDATE OF o SKIP LOCKED
+                    )
+                    UPDATE webhook_outbox AS o
+                    SET attempts = o.attempts + 1,
+                        next_attempt_at = now() + make_interval(secs => :lease)
+                    FROM webhook_subscriptions AS s
+                    WHERE s.id = o.subscription_id AND o.id IN (SELECT id FROM claimed)
+                    RETURNING o.id, o.subscription_id, o.event_type, o.attempts, o.payload,
+                              s.url, s.secret, s.batch_size
+                """),
+                {
+                    "lease": WEBHOOK_LEASE_SECONDS,
+                    "pending": WEBHOOK_PENDING,
+                    "limit": limit,
+                    "max_rows": WEBHOOK_CLAIM_MAX_ROWS,
+                },
+            ).all()
+            next_due = None
+            if not rows:
+                next_due = db.execute(
+                    text("""
+                        SELECT EXTRACT(EPOCH FROM min(next_attempt_at) - now())
+                        FROM webhook_outbox WHERE status = :pending
+                    """),
+                    {"pending": WEBHOOK_PENDING},
+                ).scalar()
+            db.commit()
+            return rows, (float(next_due) if next_due is not None else None)
+        finally:
+            db.close()
+
+    @staticmethod
+    def batches(rows: list) -> list[list]:
+        """Grouper les lignes réservées en envois : un par ligne, ou par lot de batch_size"""
+        by_subscription = {}
+        for row in sorted(rows, key=lambda row: row.id):
+            by_subscription.setdefault(row.subscription_id, []).append(row)
+        batches = []
+        for jobs in by_subscription.values():
+            size = max(1, jobs[0].batch_size)
+            batches.extend(jobs[i:i + size] for i in range(0, len(jobs), size))
+        return batches
+
+    async def send(self, batch: list) -> list[dict]:
+        """Envoyer un webhook, ou un lot en un seul POST ; une tentative par ligne"""
+        first = batch[0]
+        attempt = max(job.attempts for job in batch)
+        if first.batch_size > 1:
+            body = [job.payload for job in batch]
+            headers = {"X-Webhook-Event": "batch", "X-Webhook-Batch-Size": str(len(batch))}
+        else:
+            body = first.payload
+            headers = {"X-Webhook-Event": first.event_type, "X-Webhook-Delivery": str(first.id)}
+        content = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode()
+        timestamp = str(int(time.time()))
+        headers.update({
+            "Content-Type": "application/json",
+            "X-Webhook-Attempt": str(attempt),
+            "X-Webhook-Timestamp": timestamp,
+            "X-Webhook-Signature": webhook_signature(first.secret, timestamp, content),
+        })
+        started = time.perf_counter()
+        status_code = None
+        try:
+            self.requests += 1
+            response = await http_client.post(
+                first.url, content=content, headers=headers, timeout=WEBHOOK_TIMEOUT_SECONDS
+            )
+            status_code = response.status_code
+            error = None if response.is_success else f"HTTP {status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        # Un lot en échec est reprogrammé d'un seul délai
+        delay = backoff_seconds(attempt) if error else 0
+        return [
+            {
+                "outbox_id": job.id,
+                "attempt": job.attempts,
+                "duration_ms": duration_ms,
+                "status_code": status_code,
+                "error": error[:MAX_ERROR_LENGTH] if error else None,
+                "delay": delay,
+            }
+            for job in batch
+        ]
+
+    def record(self, attempts: list[dict]):
+        """Journaliser les tentatives et mettre à jour les webhooks en une transaction"""
+        delivered = [attempt["outbox_id"] for attempt in attempts if attempt["error"] is None]
+        retries = []
+        for attempt in attempts:
+            if attempt["error"] is None:
+                continue
+            dead = attempt["attempt"] >= WEBHOOK_MAX_ATTEMPTS
+            retries.append({
+                "id": attempt["outbox_id"],
+                "status": WEBHOOK_DEAD if dead else WEBHOOK_PENDING,
+                "delay": 0 if dead else attempt["delay"],
+                "error": attempt["error"],
+            })
+        log = [{key: value for key, value in attempt.items() if key != "delay"} for attempt in attempts]
+        db = self.session_factory()
+        try:
+            # Un désabonnement pendant l'envoi supprime les lignes (cascade) : leurs
+            # tentatives sont ignorées au lieu de faire échouer toute la transaction
+            db.execute(
+                text("""
+                    INSERT INTO webhook_attempts (outbox_id, attempt, duration_ms, status_code, error)
+                    SELECT a.outbox_id, a.attempt, a.duration_ms, a.status_code, a.error
+                    FROM jsonb_to_recordset(CAST(:attempts AS jsonb))
+                         AS a(outbox_id bigint, attempt int, duration_ms int, status_code int, error text)
+                    JOIN webhook_outbox o ON o.id = a.outbox_id
+                    FOR KEY SHARE OF o
+                """),
+                {"attempts": json.dumps(log)},
+            )
+            if delivered:
+                db.execute(
+                    text("""
+                        UPDATE webhook_outbox
+                        SET status = :delivered, delivered_at = now(), last_error = NULL
+                        WHERE id = ANY(:ids)
+                    """),
+                    {"delivered": WEBHOOK_DELIVERED, "ids": delivered},
+                )
+            if retries:
+                db.execute(
+                    text("""
+                        UPDATE webhook_outbox
+                        SET status = :status, last_error = :error,
+                            next_attempt_at = now() + make_interval(secs => :delay)
+                        WHERE id = :id
+                    """),
+                    retries,
+                )
+            db.commit()
+        finally:
+            db.close()
+        self.delivered += len(delivered)
+        self.failed += len(retries)
+        self.dead += sum(1 for retry in retries if retry["status"] == WEBHOOK_DEAD)
+
+    def purge_delivered(self, retention_days: int = WEBHOOK_RETENTION_DAYS) -> int:
+        db = self.session_factory()
+        try:
+            deleted = db.execute(
+                text("""
+                    DELETE FROM webhook_outbox
+                    WHERE status = :delivered AND delivered_at < now() - make_interval(days => :days)
+                """),
+                {"delivered": WEBHOOK_DELIVERED, "days": retention_days},
+            ).rowcount
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            timeout = WEBHOOK_POLL_SECONDS
+            try:
+                jobs, next_due = await asyncio.to_thread(self.claim)
+                if jobs:
+                    self.inflight += len(jobs)
+                    try:
+                        sent = await asyncio.gather(*(self.send(batch) for batch in self.batches(jobs)))
+                    finally:
+                        self.inflight -= len(jobs)
+                    await asyncio.to_thread(self.record, [attempt for attempts in sent for attempt in attempts])
+                    continue
+                if next_due is not None:
+                    # Prochain lot en attente (batch_linger_ms) ou prochaine relance
+                    timeout = min(WEBHOOK_POLL_SECONDS, max(next_due, 0.01))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Réservation expirée au pire : les webhooks seront repris
+                self.errors += 1
+                print(f"Webhook dispatch error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_forever(self):
+        """Démarrer les tâches d'envoi, et purger les webhooks livrés toutes les heures"""
+        self._wakeup = asyncio.Event()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            while True:
+                try:
+                    deleted = await asyncio.to_thread(self.purge_delivered)
+                    if deleted:
+                        print(f"Webhooks livrés purgés: {deleted}")
+                except Exception as e:
+                    print(f"Webhook purge error: {e}")
+                await asyncio.sleep(WEBHOOK_CLEANUP_INTERVAL_SECONDS)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._wakeup = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dead": self.dead,
+            "errors": self.errors,
+        }
+
+
+webhook_dispatcher = WebhookDispatcher()
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import func
+
+from app.database.database import SessionLocal
+from app.models.zone import DeliveryZone
+from app.schemas.schemas import Zone
+
+# Même borne que l'index de tarification pour les écritures faites par un autre worker
+ZONE_CACHE_TTL_SECONDS = float(os.environ.get("ZONE_CACHE_TTL_SECONDS", 60))
+
+_zone_list = TypeAdapter(list[Zone])
+
+
+class CachedZoneList:
+    __slots__ = ("body", "etag", "last_modified", "loaded_at")
+
+    def __init__(self, body: bytes, etag: str, last_modified: Optional[datetime], loaded_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.loaded_at = loaded_at
+
+    @property
+    def last_modified_header(self) -> Optional[str]:
+        if self.last_modified is None:
+            return None
+        return format_datetime(self.last_modified.astimezone(timezone.utc), usegmt=True)
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """Requête conditionnelle satisfaite par la version en cache
+
+        If-None-Match prime sur If-Modified-Since (RFC 9110).
+        """
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+        if if_modified_since and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            # Les dates HTTP sont à la seconde
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+
+class ZoneListCache:
+    """Corps JSON de la liste des zones actives, partagé par tout le processus
+
+    Le corps est sérialisé une fois par version ; l'ETag est un condensat du
+    corps, donc identique d'un worker à l'autre pour un même contenu.
+    """
+
+    def __init__(self, session_factory=SessionLocal, ttl: float = ZONE_CACHE_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._entry: Optional[CachedZoneList] = None
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            self.version += 1
+
+    def _load(self) -> CachedZoneList:
+        db = self.session_factory()
+        try:
+            zones = (
+                db.query(DeliveryZone)
+                .filter(DeliveryZone.is_active == True)
+                .order_by(DeliveryZone.id)
+                .all()
+            )
+            # Toutes les zones comptent : une désactivation modifie aussi la liste
+            last_modified = db.query(
+                func.max(func.coalesce(DeliveryZone.updated_at, DeliveryZone.created_at))
+            ).scalar()
+            body = _zone_list.dump_json(_zone_list.validate_python(zones, from_attributes=True))
+        finally:
+            db.close()
+
+        if last_modified is not None and last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        return CachedZoneList(body, etag, last_modified, time.monotonic())
+
+    def get(self) -> CachedZoneList:
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry.loaded_at <= self.ttl:
+            with self._lock:
+                self.hits += 1
+            return entry
+        with self._lock:
+            entry = self._entry
+            if entry is not None and time.monotonic() - entry.loaded_at <= self.ttl:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = self._entry = self._load()
+            return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+zone_list_cache = ZoneListCache()
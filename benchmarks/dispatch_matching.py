@@ -0,0 +1,111 @@
+"""Matching time and quality of the dispatch engine.
+
+First checks on a two-courier snapshot that every matcher gives the delivery
+to the nearer courier (exits non-zero otherwise). Then builds a synthetic
+snapshot (1000 pending deliveries x 300 available livreurs by default)
+with pickup points and courier positions spread over a ~20 km city, a few
+of them unknown, runs every registered matcher on the same DispatchCost
+matrix and reports solve time, total cost and the total / mean distance
+from courier to pickup. No database is needed.
+
+    python benchmarks/dispatch_matching.py [deliveries] [livreurs]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from app.services.dispatch import DispatchSnapshot, DispatchCost, MATCHERS
+from app.services.geo import haversine_km_matrix
+
+RUNS = 5
+# City centre and half-width of the synthetic area, in degrees (~10 km)
+CENTRE_LAT, CENTRE_LON = 6.37, 2.39
+SPREAD_DEGREES = 0.09
+# Share of deliveries without pickup coordinates and of couriers without a recent position
+MISSING_SHARE = 0.05
+
+
+def check_nearest_courier_wins():
+    """One delivery, two idle couriers at 1 km and 5 km: the nearer one must be chosen"""
+    snapshot = DispatchSnapshot(
+        delivery_ids=[1],
+        wait_seconds=[600],
+        livreur_ids=[10, 20],
+        livreur_load=[0, 0],
+        pickup_lat=[CENTRE_LAT],
+        pickup_lon=[CENTRE_LON],
+        # The far courier comes first so that index order cannot win by accident
+        livreur_lat=[CENTRE_LAT + 0.045, CENTRE_LAT + 0.009],
+        livreur_lon=[CENTRE_LON, CENTRE_LON],
+    )
+    cost = DispatchCost()(snapshot)
+    for name, matcher_class in MATCHERS.items():
+        pairs = matcher_class().solve(cost)
+        chosen = int(snapshot.livreur_ids[pairs[0][1]])
+        if chosen != 20:
+            sys.exit(f"{name}: delivery given to livreur {chosen}, expected the nearer livreur 20")
+    print("check: every matcher gives the delivery to the nearer courier")
+
+
+def synthetic_snapshot(n_deliveries: int, n_livreurs: int, seed: int = 42) -> DispatchSnapshot:
+    rng = np.random.default_rng(seed)
+
+    def points(count):
+        lats = CENTRE_LAT + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES, count)
+        lons = CENTRE_LON + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES, count)
+        missing = rng.random(count) < MISSING_SHARE
+        lats[missing] = np.nan
+        lons[missing] = np.nan
+        return lats, lons
+
+    pickup_lat, pickup_lon = points(n_deliveries)
+    livreur_lat, livreur_lon = points(n_livreurs)
+    return DispatchSnapshot(
+        delivery_ids=np.arange(1, n_deliveries + 1),
+        wait_seconds=rng.uniform(0, 3600, n_deliveries),
+        livreur_ids=np.arange(1, n_livreurs + 1),
+        livreur_load=rng.integers(0, 3, n_livreurs),
+        pickup_lat=pickup_lat,
+        pickup_lon=pickup_lon,
+        livreur_lat=livreur_lat,
+        livreur_lon=livreur_lon,
+    )
+
+
+def main():
+    check_nearest_courier_wins()
+    n_deliveries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_livreurs = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    snapshot = synthetic_snapshot(n_deliveries, n_livreurs)
+
+    started = time.perf_counter()
+    cost = DispatchCost()(snapshot)
+    cost_ms = (time.perf_counter() - started) * 1000
+    print(f"{n_deliveries} deliveries x {n_livreurs} livreurs, cost matrix in {cost_ms:.2f} ms")
+    distance_km = haversine_km_matrix(
+        snapshot.pickup_lat, snapshot.pickup_lon, snapshot.livreur_lat, snapshot.livreur_lon
+    )
+
+    for name, matcher_class in MATCHERS.items():
+        matcher = matcher_class()
+        timings = []
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            pairs = matcher.solve(cost)
+            timings.append(time.perf_counter() - started)
+        total = sum(cost[row, col] for row, col in pairs)
+        # Distance over the pairs where both points are known
+        known = [distance_km[row, col] for row, col in pairs if not np.isnan(distance_km[row, col])]
+        print(
+            f"{name:10} best {min(timings) * 1000:8.2f} ms  "
+            f"median {sorted(timings)[RUNS // 2] * 1000:8.2f} ms  "
+            f"pairs {len(pairs):4d}  total cost {total:12.2f}  "
+            f"distance {sum(known):8.1f} km (mean {np.mean(known):5.2f} km)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Outbound HTTP throughput: one httpx client per call vs the shared pool.
+
+Starts a local stub receiver (uvicorn, HTTPS with a throwaway self-signed
+certificate, and plain HTTP) that answers 200 to every POST, then sends
+webhook-sized JSON bodies with a fixed concurrency: the way webhooks and
+e-mails were sent before (a new AsyncClient per message, so a new SSL
+context loading the CA bundle, a new TCP connection and TLS handshake),
+then through the application's shared client (app/services/http_client.py).
+Reports requests/s and latency percentiles. The stub runs on the same machine, so real network
+round trips would widen the gap; it only speaks HTTP/1.1, so HTTP/2 is
+not exercised here.
+
+    python benchmarks/outbound_http.py [requests] [concurrency]
+"""
+import asyncio
+import datetime
+import ipaddress
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import certifi
+import httpx
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app.services.http_client import build_client
+
+HTTPS_PORT = 8443
+HTTP_PORT = 8480
+BODY = {
+    "id": 123456,
+    "event": "delivery_status_changed",
+    "timestamp": "2026-10-17T12:00:00+00:00",
+    "data": {"delivery_id": 4242, "client_id": 17, "livreur_id": 42, "status": "en_route_livraison"},
+}
+
+
+async def stub_app(scope, receive, send):
+    """Receiver: read the body, answer 200"""
+    if scope["type"] != "http":
+        return
+    more = True
+    while more:
+        message = await receive()
+        more = message.get("more_body", False)
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"2")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def self_signed_certificate(directory: str) -> tuple[str, str]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+            critical=False,
+        )
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return cert_path, key_path
+
+
+def start_stub(port: int, tls: tuple[str, str] = None) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "uvicorn", "outbound_http:stub_app", "--app-dir", os.path.join(ROOT, "benchmarks"),
+        "--port", str(port), "--log-level", "warning", "--no-access-log", "--backlog", "4096",
+    ]
+    if tls:
+        command += ["--ssl-certfile", tls[0], "--ssl-keyfile", tls[1]]
+    return subprocess.Popen(command)
+
+
+def trust_store(cert_path: str = None) -> ssl.SSLContext:
+    """What httpx builds for verify=True (CA bundle), plus the stub's certificate"""
+    context = ssl.create_default_context(cafile=certifi.where())
+    if cert_path:
+        context.load_verify_locations(cert_path)
+    return context
+
+
+def wait_until_up(url: str, verify):
+    for _ in range(100):
+        try:
+            httpx.post(url, json={}, verify=verify)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    sys.exit(f"stub at {url} did not start")
+
+
+async def run(send, count: int, concurrency: int) -> tuple[float, list[float]]:
+    latencies = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            response = await send()
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return time.perf_counter() - started, latencies
+
+
+async def bench(url: str, cert_path: str, count: int, concurrency: int):
+    async def per_call():
+        # Previous pattern: a new client (SSL context), connection and handshake per message
+        async with httpx.AsyncClient(verify=trust_store(cert_path)) as client:
+            return await client.post(url, json=BODY)
+
+    shared = build_client(verify=trust_store(cert_path))
+
+    async def pooled():
+        return await shared.post(url, json=BODY)
+
+    try:
+        await pooled()
+        for name, send in (("client per call", per_call), ("shared pool", pooled)):
+            elapsed, latencies = await run(send, count, concurrency)
+            latencies.sort()
+            print(
+                f"  {name:16} {count / elapsed:8.0f} req/s  "
+                f"p50 {statistics.median(latencies):7.2f} ms  p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms"
+            )
+    finally:
+        await shared.aclose()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = self_signed_certificate(directory)
+        stubs = [start_stub(HTTPS_PORT, (cert_path, key_path)), start_stub(HTTP_PORT)]
+        try:
+            https_url = f"https://127.0.0.1:{HTTPS_PORT}/hook"
+            http_url = f"http://127.0.0.1:{HTTP_PORT}/hook"
+            wait_until_up(https_url, cert_path)
+            wait_until_up(http_url, True)
+            print(f"{count} POSTs, {concurrency} concurrent, local stub receiver")
+            print("HTTPS")
+            asyncio.run(bench(https_url, cert_path, count, concurrency))
+            print("HTTP")
+            asyncio.run(bench(http_url, None, count, concurrency))
+        finally:
+            for stub in stubs:
+                stub.terminate()
+                stub.wait()
+
+
+if __name__ == "__main__":
+    main()
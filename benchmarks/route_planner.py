@@ -0,0 +1,89 @@
+"""Route planner quality and solve time.
+
+For 5 to 40 stops (half pickups, half dropoffs, around Abidjan) it reports
+the nearest-neighbour route length, the final length after local search,
+solve time against the time budget, and for small instances the gap to the
+exact optimum found by enumeration. No database is needed.
+
+    python benchmarks/route_planner.py [instances_per_size]
+"""
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from app.services.route_planner import (
+    RoutePlanner, RouteStop, PICKUP, DROPOFF, ROUTE_PLANNER_TIME_BUDGET_MS, distance_matrix,
+)
+
+SIZES = (5, 10, 20, 30, 40)
+EXACT_MAX_STOPS = 8
+CENTER_LAT, CENTER_LON = 5.35, -4.0
+
+
+def synthetic_stops(n_stops: int, rng: random.Random) -> list[RouteStop]:
+    """n_stops arrêts : couples pickup/dropoff, plus un dropoff seul si n_stops est impair (colis déjà récupéré)"""
+    stops = []
+    for delivery_id in range(n_stops // 2):
+        for kind in (PICKUP, DROPOFF):
+            stops.append(RouteStop(delivery_id, kind, CENTER_LAT + rng.uniform(-0.1, 0.1), CENTER_LON + rng.uniform(-0.1, 0.1)))
+    if n_stops % 2:
+        stops.append(RouteStop(n_stops, DROPOFF, CENTER_LAT + rng.uniform(-0.1, 0.1), CENTER_LON + rng.uniform(-0.1, 0.1)))
+    rng.shuffle(stops)
+    return stops
+
+
+def route_length(order, origin) -> float:
+    points = [origin] + [(stop.lat, stop.lon) for stop in order]
+    dist = distance_matrix([p[0] for p in points], [p[1] for p in points])
+    return float(dist[np.arange(len(points) - 1), np.arange(1, len(points))].sum())
+
+
+def exact_length(stops, origin) -> float:
+    """Longueur optimale par énumération de tous les ordres valides"""
+    pickups = {stop.delivery_id for stop in stops if stop.kind == PICKUP}
+
+    def feasible(order):
+        seen = set()
+        for stop in order:
+            if stop.kind == PICKUP:
+                seen.add(stop.delivery_id)
+            elif stop.delivery_id in pickups and stop.delivery_id not in seen:
+                return False
+        return True
+
+    return min(route_length(order, origin) for order in itertools.permutations(stops) if feasible(order))
+
+
+def main():
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    planner = RoutePlanner()
+    nearest_only = RoutePlanner(time_budget_ms=0)
+    origin = (CENTER_LAT, CENTER_LON)
+    print(f"time budget {ROUTE_PLANNER_TIME_BUDGET_MS:.0f} ms, {instances} instances per size")
+    for n_stops in SIZES:
+        rng = random.Random(n_stops)
+        timings, nn_lengths, lengths, gaps = [], [], [], []
+        for _ in range(instances):
+            stops = synthetic_stops(n_stops, rng)
+            _, nn_legs = nearest_only.plan(stops, origin)
+            started = time.perf_counter()
+            _, legs = planner.plan(stops, origin)
+            timings.append((time.perf_counter() - started) * 1000)
+            nn_lengths.append(nn_legs.sum())
+            lengths.append(legs.sum())
+            if n_stops <= EXACT_MAX_STOPS:
+                gaps.append(legs.sum() / exact_length(stops, origin) - 1)
+        gap = f"  gap to optimum {np.mean(gaps) * 100:5.2f}% mean, {np.max(gaps) * 100:5.2f}% max" if gaps else ""
+        print(
+            f"{n_stops:3d} stops  median {np.median(timings):6.2f} ms  max {np.max(timings):6.2f} ms  "
+            f"nearest neighbour {np.mean(nn_lengths):6.2f} km -> {np.mean(lengths):6.2f} km{gap}"
+        )
+
+
+if __name__ == "__main__":
+    main()
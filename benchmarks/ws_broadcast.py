@@ -0,0 +1,152 @@
+"""Broadcast latency of the WebSocket ConnectionManager.
+
+Connects 5000 in-memory fake sockets (1% slow, 0.2% dead by default) and
+measures, per broadcast, the time until every healthy client has received
+the message. The same workload is replayed against the previous
+sequential implementation (await send_json on each socket in turn) for
+comparison. No server or network is involved.
+
+    python benchmarks/ws_broadcast.py [clients] [broadcasts]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routes.websockets import ConnectionManager
+
+SLOW_SHARE = 0.01
+DEAD_SHARE = 0.002
+SLOW_SEND_SECONDS = 0.05
+MESSAGE = {
+    "type": "status_update",
+    "delivery_id": 123456,
+    "status": "en_route_livraison",
+    "livreur_id": 42,
+    "updated_at": "2026-10-17T10:00:00+00:00",
+}
+
+
+class FakeWebSocket:
+    def __init__(self, kind: str, arrivals: dict):
+        self.kind = kind
+        self.arrivals = arrivals
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        if self.kind == "dead":
+            raise ConnectionResetError("client gone")
+        if self.kind == "slow":
+            await asyncio.sleep(SLOW_SEND_SECONDS)
+            return
+        await asyncio.sleep(0)
+        self.arrivals[text] = self.arrivals.get(text, 0) + 1
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+def build_clients(count: int, arrivals: dict, unhealthy: bool = True):
+    clients = []
+    for i in range(count):
+        if unhealthy and i % int(1 / DEAD_SHARE) == int(1 / DEAD_SHARE) - 1:
+            kind = "dead"
+        elif unhealthy and i % int(1 / SLOW_SHARE) == 0:
+            kind = "slow"
+        else:
+            kind = "fast"
+        clients.append(FakeWebSocket(kind, arrivals))
+    return clients
+
+
+async def wait_for(arrivals: dict, text: str, expected: int):
+    while arrivals.get(text, 0) < expected:
+        await asyncio.sleep(0)
+
+
+async def bench_queued(count: int, broadcasts: int, unhealthy: bool = True):
+    arrivals = {}
+    clients = build_clients(count, arrivals, unhealthy)
+    manager = ConnectionManager()
+    for client in clients:
+        await manager.connect(client)
+    healthy = sum(1 for client in clients if client.kind == "fast")
+    latencies = []
+    for n in range(broadcasts):
+        message = dict(MESSAGE)
+        # Trame attendue : le manager ajoute le numéro de séquence
+        text = json.dumps(dict(message, seq=manager.sequence + 1), separators=(",", ":"), ensure_ascii=False)
+        started = time.perf_counter()
+        await manager.broadcast(message)
+        publish_ms = (time.perf_counter() - started) * 1000
+        await wait_for(arrivals, text, healthy)
+        latencies.append(((time.perf_counter() - started) * 1000, publish_ms))
+    stats = manager.stats()
+    for websocket in list(manager.connections):
+        manager.disconnect(websocket)
+    return latencies, stats
+
+
+async def bench_sequential(count: int, broadcasts: int, unhealthy: bool = True):
+    """Ancienne diffusion : un send_json après l'autre ; une socket morte interrompt la boucle"""
+    arrivals = {}
+    clients = build_clients(count, arrivals, unhealthy)
+    latencies = []
+    reached = []
+    for n in range(broadcasts):
+        message = dict(MESSAGE, seq=n)
+        started = time.perf_counter()
+        delivered = 0
+        try:
+            for client in clients:
+                await client.send_json(message)
+                delivered += client.kind == "fast"
+        except ConnectionResetError:
+            pass
+        latencies.append(((time.perf_counter() - started) * 1000, None))
+        reached.append(delivered)
+    return latencies, reached
+
+
+def summary(name, latencies):
+    totals = [total for total, _ in latencies]
+    line = f"{name:11} median {statistics.median(totals):9.2f} ms  max {max(totals):9.2f} ms"
+    publish = [p for _, p in latencies if p is not None]
+    if publish:
+        line += f"  (broadcast() returns in {statistics.median(publish):.2f} ms)"
+    print(line)
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    broadcasts = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    healthy = sum(1 for client in build_clients(count, {}) if client.kind == "fast")
+    print(f"{count} clients ({healthy} healthy), {broadcasts} broadcasts, "
+          f"slow clients take {SLOW_SEND_SECONDS * 1000:.0f} ms per send")
+
+    latencies, stats = await bench_queued(count, broadcasts)
+    summary("queued", latencies)
+    print(f"            {stats}")
+
+    latencies, reached = await bench_sequential(count, min(broadcasts, 3))
+    summary("sequential", latencies)
+    print(f"            healthy clients reached per broadcast: {reached[0]}/{healthy} (the first dead socket aborts it)")
+
+    print("all clients healthy:")
+    latencies, _ = await bench_queued(count, broadcasts, unhealthy=False)
+    summary("queued", latencies)
+    latencies, _ = await bench_sequential(count, broadcasts, unhealthy=False)
+    summary("sequential", latencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Bytes on the wire for one /ws/deliveries subscriber, per frame format.
+
+Replays a rush-hour burst (every delivery is created, assigned, then moves
+through its statuses within a couple of seconds) through the
+ConnectionManager into an in-memory socket, once per frame option
+(plain JSON, coalescing window, deltas, MessagePack, all combined), and
+reports frames and bytes sent. The "deflated" column compresses each frame
+the way permessage-deflate does (raw deflate, shared context, sync flush).
+
+    python benchmarks/ws_frames.py [deliveries] [coalesce_ms]
+"""
+import asyncio
+import os
+import random
+import sys
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routes.websockets import ConnectionManager, FrameOptions, msgpack
+
+STATUSES = ["en_route_pickup", "colis_recupere", "en_route_livraison", "livree"]
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames.append(text.encode())
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+
+
+def timeline(deliveries: int, seed: int = 0):
+    """(délai en secondes, message) triés par instant d'émission"""
+    rng = random.Random(seed)
+    events = []
+    for delivery_id in range(1, deliveries + 1):
+        at = rng.uniform(0, 3)
+        events.append((at, {
+            "type": "new_delivery",
+            "delivery_id": delivery_id,
+            "client_id": 1000 + delivery_id,
+            "client_nom": "Client %d" % delivery_id,
+            "client_telephone": "+2250700%06d" % delivery_id,
+            "type_colis": "colis",
+            "adresse_pickup": "Cocody Riviera 2, rue %d" % delivery_id,
+            "adresse_dropoff": "Plateau, avenue %d" % delivery_id,
+            "status": "en_attente",
+            "created_at": "2026-10-17T12:00:00+00:00",
+        }))
+        at += rng.uniform(0.05, 0.3)
+        events.append((at, {
+            "type": "assigned",
+            "delivery_id": delivery_id,
+            "livreur_id": 42,
+            "status": STATUSES[0],
+        }))
+        for statut in STATUSES[1:]:
+            at += rng.uniform(0.05, 0.6)
+            events.append((at, {"type": "status_update", "delivery_id": delivery_id, "status": statut}))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+async def replay(events, options: FrameOptions) -> list[bytes]:
+    manager = ConnectionManager()
+    websocket = RecordingWebSocket()
+    connection = await manager.connect(websocket, options=options)
+    manager.subscribe(connection, "managers")
+    start = asyncio.get_running_loop().time()
+    for at, message in events:
+        delay = start + at - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        manager.publish(message, ["managers"])
+    await asyncio.sleep(options.coalesce + 0.05)
+    manager.disconnect(websocket)
+    return websocket.frames
+
+
+def deflated_size(frames: list[bytes]) -> int:
+    compressor = zlib.compressobj(wbits=-15)
+    return sum(len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4 for frame in frames)
+
+
+async def main():
+    deliveries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    coalesce_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    events = timeline(deliveries)
+    variants = [
+        ("json", FrameOptions()),
+        ("coalesce", FrameOptions(coalesce_ms=coalesce_ms)),
+        ("delta", FrameOptions(delta=True)),
+        ("coalesce+delta", FrameOptions(coalesce_ms=coalesce_ms, delta=True)),
+    ]
+    if msgpack is not None:
+        variants += [
+            ("msgpack", FrameOptions(msgpack=True)),
+            ("all", FrameOptions(msgpack=True, coalesce_ms=coalesce_ms, delta=True)),
+        ]
+    print(f"{deliveries} deliveries, {len(events)} events, coalescing window {coalesce_ms} ms")
+    print(f"{'frames format':16} {'frames':>7} {'bytes':>9} {'deflated':>9}")
+    baseline = None
+    for name, options in variants:
+        frames = await replay(events, options)
+        size = sum(len(frame) for frame in frames)
+        deflated = deflated_size(frames)
+        baseline = baseline or size
+        print(f"{name:16} {len(frames):7d} {size:9d} {deflated:9d}  ({deflated / baseline:.0%} of plain JSON)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
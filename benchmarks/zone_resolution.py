@@ -0,0 +1,98 @@
+"""Point-to-zone resolution throughput.
+
+Builds a synthetic city of irregular zone polygons (a 20 x 20 jittered grid
+of 12-sided polygons around Abidjan by default), then resolves random points
+through the uniform grid index used by GET /zones/resolve and through a
+brute-force scan over every polygon for comparison. No database is needed.
+
+    python benchmarks/zone_resolution.py [zones_per_side] [lookups]
+
+The target is 10k lookups/s on one core.
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.geo import Polygon, PolygonGrid
+from app.services.pricing import ZoneEntry
+
+CENTER_LAT, CENTER_LON = 5.35, -4.0
+CITY_SPAN_DEGREES = 0.3
+TARGET_LOOKUPS_PER_SECOND = 10_000
+
+
+def synthetic_zones(per_side: int, seed: int = 42):
+    rng = random.Random(seed)
+    step = CITY_SPAN_DEGREES / per_side
+    origin_lat = CENTER_LAT - CITY_SPAN_DEGREES / 2
+    origin_lon = CENTER_LON - CITY_SPAN_DEGREES / 2
+    zones = []
+    for row in range(per_side):
+        for col in range(per_side):
+            center_lat = origin_lat + (row + 0.5) * step
+            center_lon = origin_lon + (col + 0.5) * step
+            points = []
+            for k in range(12):
+                angle = 2 * math.pi * k / 12
+                radius = step * rng.uniform(0.45, 0.7)
+                points.append((center_lat + radius * math.sin(angle), center_lon + radius * math.cos(angle)))
+            zone_id = row * per_side + col + 1
+            zones.append((ZoneEntry(zone_id, f"zone {zone_id}", 1000), Polygon(points)))
+    return zones
+
+
+def brute_force(zones, lat, lon):
+    for zone, polygon in zones:
+        if polygon.contains(lat, lon):
+            return zone
+    return None
+
+
+def measure(name, resolve, points):
+    started = time.perf_counter()
+    found = sum(1 for lat, lon in points if resolve(lat, lon) is not None)
+    elapsed = time.perf_counter() - started
+    rate = len(points) / elapsed
+    print(
+        f"{name:12} {rate:12,.0f} lookups/s  {elapsed / len(points) * 1e6:7.2f} us/lookup  "
+        f"matched {found}/{len(points)}"
+    )
+    return rate
+
+
+def main():
+    per_side = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    zones = synthetic_zones(per_side)
+
+    started = time.perf_counter()
+    grid = PolygonGrid(zones)
+    print(f"{len(zones)} zones, grid of {len(grid)} cells built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    rng = random.Random(7)
+    half = CITY_SPAN_DEGREES / 2
+    points = [
+        (CENTER_LAT + rng.uniform(-half, half), CENTER_LON + rng.uniform(-half, half))
+        for _ in range(lookups)
+    ]
+    # Zones may overlap: the grid returns the smallest one, brute force the first.
+    # Both must agree on whether a point is covered, and the grid's zone must contain it.
+    polygons = {zone.id: polygon for zone, polygon in zones}
+    for lat, lon in points[:2000]:
+        zone = grid.lookup(lat, lon)
+        expected = brute_force(zones, lat, lon)
+        if (zone is None) != (expected is None) or (zone and not polygons[zone.id].contains(lat, lon)):
+            sys.exit(f"grid and brute force disagree at ({lat}, {lon})")
+
+    rate = measure("grid", grid.lookup, points)
+    measure("brute force", lambda lat, lon: brute_force(zones, lat, lon), points[: max(lookups // 50, 1000)])
+    if rate < TARGET_LOOKUPS_PER_SECOND:
+        sys.exit(f"grid index below the {TARGET_LOOKUPS_PER_SECOND:,} lookups/s target")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,6 @@ done
 alembic upgrade head
 
 # Start FastAPI app
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --ws websockets \
+  --ws-per-message-deflate "${WS_PER_MESSAGE_DEFLATE:-true}" \
+  --ws-ping-interval 20 --ws-ping-timeout 20
\ No newline at end of file